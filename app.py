@@ -1,226 +1,282 @@
 # app.py
 from flask import Flask, render_template, jsonify, request, Response
+import click
 
-import subprocess
+import glob
+import math
 import os
+import shutil
 import signal
 import sys
 import threading # Use threading for better control over the subprocess
 from werkzeug.utils import secure_filename
 import time
 
-# For tool2 gun detector
-import cv2
-from cvzone.HandTrackingModule import HandDetector
-import numpy as np
+# OpenCV and NumPy load on first use, so the landing pages don't wait for them
+from tools.lazy_imports import import_report, lazy_import, warm_up
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 import threading as py_threading
-from playsound import playsound
+from tools.camera_service import get_camera
+from tools.mjpeg_broadcaster import MJPEGBroadcaster
+from tools.detection_worker import cached_detect_hands, default_detector, draw_hands, get_detection_worker
+from tools.hand_poses import classify_hands, landmark_array, pinch_distance
+from tools.overlay_cache import TextOverlay, static_text
+from tools.live_values import LiveValues
+from tools.state_store import get_state_store, process_alive
+from tools.gesture_engine import GestureEngine
+from tools.hand_tracker import HandTracker
+from tools.gesture_registry import get_gesture_registry
+from tools.action_dispatcher import get_action_dispatcher
+from tools.audio_mixer import get_audio_mixer
+from tools.image_pyramid import ImagePyramid
+from tools.tool_supervisor import ToolSupervisor
+from tools.stage_tracer import all_tracers, get_tracer, prometheus_text
 
 app = Flask(__name__)
 
-gesture_process = None
-gesture_thread = None # To manage the lifecycle of the gesture detection in a separate thread
-
-# Define a lock to prevent race conditions when modifying gesture_process
-import threading
-process_lock = threading.Lock()
-
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# For tool5 volume control
-tool5_volume_thread = None
-tool5_volume_running = False
-current_volume = 50.0  # Default volume percentage
+# Largest /tool3_view viewport side in pixels
+TOOL3_MAX_VIEW = 4096
+
+# Tool status lives in a SQLite store shared by every gunicorn worker instead
+# of module globals. The tool1/tool2 running flags, the tool3 zoom loop and the
+# voice assistant record the pid of the worker that started them, so entries
+# left by a crashed server count as stopped
+state_store = get_state_store()
+OWNER_KEYS = ('tool1.running', 'tool2.running', 'tool3.zoom_owner', 'voice.owner', 'tools.warm_owner')
+
+# Desktop tool scripts run in warm worker processes with OpenCV and cvzone
+# already imported, so starting one takes milliseconds. They are spawned by
+# the warm-up after the first request (see the end of this file), in one
+# server process only. Running tools are recorded in the state store, so any
+# gunicorn worker can stop a tool another one started.
+tool_supervisor = ToolSupervisor(warm=False, state_store=state_store)
+tool_supervisor.register('tool1_launcher', 'tools.tool1_gesture_launcher', ['cv2', 'numpy', 'cvzone.HandTrackingModule'])
+tool_supervisor.register('tool4_face', 'tools.tool4_facedetection', ['cv2', 'numpy', 'cvzone.FaceDetectionModule'])
+tool_supervisor.register('tool5_volume', 'tools.tool5_volume_control', ['cv2', 'numpy', 'cvzone.HandTrackingModule'])
 
 # For tool3 zoom control
-tool3_zoom_scale = 1.0  # Default zoom scale
 tool3_zoom_thread = None
-tool3_zoom_running = False
 
-def run_tool5_volume_control():
-    global tool5_volume_running, current_volume
-    script_path = os.path.join(os.path.dirname(__file__), 'tools', 'tool5_volume_control.py')
-    try:
-        if sys.platform == "win32":
-            subprocess.run(['python', script_path])
-        else:
-            subprocess.run(['python', script_path])
-    except Exception as e:
-        print(f"Error running volume control script: {e}", file=sys.stderr)
-    finally:
-        tool5_volume_running = False
+# The last upload is recorded in the state store as 'tool3.image', so every
+# worker can serve /tool3_view; each opens the pyramid itself on first use
+tool3_pyramid = {'key': None, 'pyramid': None, 'tiles': False}
+tool3_pyramid_lock = threading.Lock()
+
+# Zoom scale and volume are pushed to open tool3/tool5 pages over /events
+live_values = LiveValues({'zoom': 0.01, 'volume': 0.5}, state_store)
+live_values.setdefault('zoom', 1.0)  # Default zoom scale
+live_values.setdefault('volume', 50.0)  # Default volume percentage
+
+def is_live_owner(pid):
+    # Flags written before owners were recorded hold True rather than a pid
+    return type(pid) is int and process_alive(pid)
+
+def owner_alive(key):
+    """pid recorded under `key` if that process is still running, else None"""
+    pid = state_store.get(key)
+    return pid if is_live_owner(pid) else None
+
+def claim(key):
+    """Record this worker as the owner of `key` unless a live process owns it"""
+    pid = os.getpid()
+    return state_store.update(key, lambda current: current if is_live_owner(current) else pid)[1] is not None
+
+# Clear owners left behind by a server that crashed or was killed; entries of
+# workers that are still running (other gunicorn workers) are kept
+for key in OWNER_KEYS:
+    pid = state_store.get(key)
+    if pid is not None and not is_live_owner(pid):
+        state_store.compare_and_set(key, pid, None)
+
+# Finger patterns and their actions live in gestures.json, reloaded on change
+tool1_gestures = get_gesture_registry()
+
+def tool1_guide_lines(width, height):
+    guide_text = ["Gesture Guide:"] + tool1_gestures.guide_lines()
+    return [(text, (50, height - 150 + (i * 25)), 0.6, (255, 255, 255), 2) for i, text in enumerate(guide_text)]
+
+# Rendered once per frame size instead of six putText calls per frame
+tool1_guide_overlay = TextOverlay(tool1_guide_lines)
+
+def make_tool1_frame_processor():
+    """Build the per-frame gesture overlay shared by all tool1 viewers
+
+    Landmarks come from the shared detection worker, so the stream runs at
+    camera rate; gesture decisions are made once per new detection result.
+    Each tracked hand (MAX_HANDS > 1) has its own debouncer.
+    """
+    detection = get_detection_worker().acquire()
+    engines = {}
+    state = {'seq': 0, 'message': None}
+    tracer = get_tracer('tool1')
+
+    def process(img):
+        img = cv2.flip(img, 1)
+        tracer.mark('flip')
+        result = detection.latest()
+        hands = result.hands if result else []
+        draw_hands(img, hands)
+        tracer.mark('draw_hands')
+
+        # Feed each new detection to the debouncer; a pattern fires once it
+        # has been stable for a few detections and again only after it changes
+        gesture = None
+        if result is not None and result.seq != state['seq']:
+            state['seq'] = result.seq
+            ids = [hand.get('id', 0) for hand in hands]
+            # Hands that left take their debouncer with them
+            for hand_id in set(engines) - set(ids):
+                del engines[hand_id]
+            for hand_id, hand in zip(ids, hands):
+                engine = engines.get(hand_id)
+                if engine is None:
+                    engine = engines[hand_id] = GestureEngine.from_env()
+                fired = engine.update(hand, result.timestamp)
+                if gesture is None:
+                    gesture = fired
+            if not hands:
+                state['message'] = None
+        tracer.mark('gesture')
 
-# For tool4 face detection
-tool4_face_process = None
-tool4_face_thread = None
+        if hands:
+            patterns = [engines[hand.get('id', 0)].current() for hand in hands if hand.get('id', 0) in engines]
 
-def run_tool4_face_detection():
-    global tool4_face_process
-    script_path = os.path.join(os.path.dirname(__file__), 'tools', 'tool4_facedetection.py')
-    try:
-        if sys.platform == "win32":
-            tool4_face_process = subprocess.Popen(['python', script_path])
-        else:
-            tool4_face_process = subprocess.Popen(['python', script_path])
-        
-        print(f"Face detection process started with PID: {tool4_face_process.pid}", file=sys.stderr)
-        tool4_face_process.wait()
-        print("Face detection process finished.", file=sys.stderr)
-    except Exception as e:
-        print(f"Error running face detection script: {e}", file=sys.stderr)
-    finally:
-        tool4_face_process = None
+            # Display current finger pattern on screen
+            cv2.putText(img, "Fingers: " + "  ".join(str(p) for p in patterns), (50, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+            if gesture is not None:
+                entry, future = tool1_gestures.trigger(gesture)
+                if entry is not None and future is not None:
+                    action_text = f"Opening {entry.name}..."
+                    state['message'] = (action_text, (0, 255, 0))
+                    print(f"Gesture Action: {action_text}", file=sys.stderr)
 
-# For tool1 gesture detection with web streaming
-tool1_gesture_running = False
-tool1_gesture_lock = py_threading.Lock()
-tool1_last_action_time = 0
-tool1_action_cooldown = 3  # 3 seconds cooldown between actions
+                    # The action runs off the frame loop; report failures when it finishes
+                    def report(done, message=state['message']):
+                        failed = done.exception() is not None or done.result() is False
+                        if failed and state['message'] is message:
+                            state['message'] = ("Action failed!", (0, 0, 255))
 
-def open_browser_app(url):
-    """Cross-platform browser opening function"""
-    import webbrowser
-    try:
-        webbrowser.open(url)
-        return True
-    except Exception as e:
-        print(f"Error opening browser: {e}", file=sys.stderr)
-        return False
+                    future.add_done_callback(report)
+                else:
+                    state['message'] = None
+
+            # Keep the last action on screen until another gesture fires or the hand leaves
+            if state['message'] is not None:
+                text, color = state['message']
+                cv2.putText(img, text, (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
 
-def gen_tool1_gesture_frames():
-    global tool1_gesture_running, tool1_last_action_time
-    cap = cv2.VideoCapture(0)
-    cap.set(3, 1280)
-    cap.set(4, 720)
-    detector = HandDetector(detectionCon=0.8, maxHands=1)
-    tool1_gesture_running = True
-    
-    while tool1_gesture_running:
-        success, img = cap.read()
-        if not success:
-            continue
-            
-        img = cv2.flip(img, 1)
-        hands, img = detector.findHands(img)
-        current_time = time.time()
-        
-        if hands:
-            hand = hands[0]
-            fingers = detector.fingersUp(hand)
-            
-            # Display current finger pattern on screen
-            cv2.putText(img, f"Fingers: {fingers}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            
-            # Check if enough time has passed since last action
-            if current_time - tool1_last_action_time > tool1_action_cooldown:
-                action_taken = False
-                action_text = ""
-                
-                # 1 Finger (Index Finger Up) - Google
-                if fingers == [0,1,0,0,0]:
-                    action_text = "Opening Google..."
-                    action_taken = open_browser_app("https://www.google.com")
-                    
-                # 2 Fingers (Index and Middle Finger Up) - YouTube
-                elif fingers == [0,1,1,0,0]:
-                    action_text = "Opening YouTube..."
-                    action_taken = open_browser_app("https://www.youtube.com")
-                    
-                # 3 Fingers (Index, Middle, Ring Finger Up) - Amazon
-                elif fingers == [0,1,1,1,0]:
-                    action_text = "Opening Amazon..."
-                    action_taken = open_browser_app("https://www.amazon.com")
-                    
-                # 5 Fingers (All Fingers Up) - WhatsApp
-                elif fingers == [1,1,1,1,1]:
-                    action_text = "Opening WhatsApp..."
-                    action_taken = open_browser_app("https://web.whatsapp.com")
-                    
-                # 4 Fingers (Thumb down) - MyGyanVihar
-                elif fingers == [0,1,1,1,1]:
-                    action_text = "Opening MyGyanVihar..."
-                    action_taken = open_browser_app("https://mygyanvihar.com")
-                
-                if action_taken:
-                    tool1_last_action_time = current_time
-                    cv2.putText(img, action_text, (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    print(f"Gesture Action: {action_text}", file=sys.stderr)
-                elif action_text:
-                    cv2.putText(img, "Action failed!", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            else:
-                remaining_time = tool1_action_cooldown - (current_time - tool1_last_action_time)
-                cv2.putText(img, f"Cooldown: {remaining_time:.1f}s", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
-        
         # Add gesture guide on the frame
-        guide_text = [
-            "Gesture Guide:",
-            "1 finger: Google",
-            "2 fingers: YouTube", 
-            "3 fingers: Amazon",
-            "4 fingers: MyGyanVihar",
-            "5 fingers: WhatsApp"
-        ]
+        tool1_guide_overlay.apply(img)
+        tracer.mark('overlay')
         
-        for i, text in enumerate(guide_text):
-            y_pos = img.shape[0] - 150 + (i * 25)
-            cv2.putText(img, text, (50, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        # Encode frame as JPEG
-        ret, buffer = cv2.imencode('.jpg', img)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-    
-    cap.release()
+        return img
+
+    def is_idle():
+        result = detection.latest()
+        return result is None or not result.hands
+
+    process.close = detection.release
+    process.is_idle = is_idle
+    return process
+
+# One broadcaster per tool: detection and JPEG encoding run once per frame no
+# matter how many viewers are connected
+tool1_broadcaster = MJPEGBroadcaster('tool1', make_tool1_frame_processor)
+
+def gen_tool1_gesture_frames():
+    return tool1_broadcaster.stream()
+
+# Stopping a feed in any worker stops the broadcaster in the worker serving it
+def stop_broadcaster_when_cleared(key, broadcaster):
+    def on_change(running):
+        if not running:
+            broadcaster.stop()
+    state_store.subscribe(key, on_change)
+
 
 # For tool2 gun detector video stream
-tool2_video_running = False
-tool2_video_lock = py_threading.Lock()
 tool2_fire_effect = False
 tool2_fire_counter = 0
 
-def play_fire_sound():
-    sound_path = os.path.join(os.path.dirname(__file__), 'static', 'sound.mp3')
-    py_threading.Thread(target=playsound, args=(sound_path,), daemon=True).start()
+# The fire sound is decoded once (at warm-up or the first shot) and mixed
+# in-process; without a decoder it falls back to playsound on the action queue
+fire_sound_path = os.path.join(os.path.dirname(__file__), 'static', 'sound.mp3')
+audio_mixer = get_audio_mixer()
+fire_sound_lock = py_threading.Lock()
+fire_sound_state = {'loaded': False, 'error': None}
+
+def load_fire_sound():
+    with fire_sound_lock:
+        if not fire_sound_state['loaded']:
+            fire_sound_state['loaded'] = True
+            try:
+                audio_mixer.load('fire', fire_sound_path)
+            except Exception as e:
+                fire_sound_state['error'] = e
+                print(f"Fire sound not preloaded ({e}); using playsound", file=sys.stderr)
+    return fire_sound_state['error'] is None
+
+def play_fire_sound(triggered_at=None):
+    if load_fire_sound():
+        audio_mixer.play('fire', triggered_at, min_interval=0.3)
+    else:
+        from playsound import playsound
+        # One shot at a time: a held pose re-fires only after the sound finishes
+        get_action_dispatcher().submit('fire_sound', playsound, fire_sound_path, min_interval=0.3)
 
-def gen_tool2_frames():
-    global tool2_video_running, tool2_fire_effect, tool2_fire_counter
-    cap = cv2.VideoCapture(0)
-    cap.set(3, 1280)
-    cap.set(4, 720)
-    detector = HandDetector(detectionCon=0.8, maxHands=1)
-    tool2_video_running = True
-    while tool2_video_running:
-        success, img = cap.read()
-        if not success:
-            continue
+tool2_fire_overlay = static_text(("FIRE!", (600, 200), 2, (0, 0, 255), 5))
+
+def make_tool2_frame_processor():
+    """Build the per-frame gun gesture overlay shared by all tool2 viewers"""
+    detection = get_detection_worker().acquire()
+    state = {'seq': 0}
+    tracer = get_tracer('tool2')
+
+    def process(img):
+        global tool2_fire_effect, tool2_fire_counter
         img = cv2.flip(img, 1)
-        hands, img = detector.findHands(img)
-        if hands:
-            hand = hands[0]
-            lmList = hand['lmList']
-            thumb_tip = lmList[4]
-            index_tip = lmList[8]
-            middle_tip = lmList[12]
-            thumb_up = thumb_tip[1] < lmList[3][1]
-            index_up = index_tip[1] < lmList[6][1]
-            middle_down = middle_tip[1] > lmList[10][1]
-            if thumb_up and index_up and middle_down:
+        tracer.mark('flip')
+        result = detection.latest()
+        hands = result.hands if result else []
+        draw_hands(img, hands)
+        tracer.mark('draw_hands')
+        # Only check the pose once per detection result
+        if hands and result.seq != state['seq']:
+            state['seq'] = result.seq
+            if classify_hands(hands)['gun'].any():
                 tool2_fire_effect = True
                 tool2_fire_counter = 5
-                play_fire_sound()
+                # Latency is measured from the end of the detection that saw the pose
+                play_fire_sound(result.timestamp + result.latency)
+        tracer.mark('gesture')
         if tool2_fire_effect:
             tool2_fire_counter -= 1
-            cv2.putText(img, "FIRE!", (600, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 5)
+            tool2_fire_overlay.apply(img)
             if tool2_fire_counter <= 0:
                 tool2_fire_effect = False
-        # Encode frame as JPEG
-        ret, buffer = cv2.imencode('.jpg', img)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-    cap.release()
+        tracer.mark('overlay')
+        return img
+
+    def is_idle():
+        result = detection.latest()
+        return not tool2_fire_effect and (result is None or not result.hands)
+
+    process.close = detection.release
+    process.is_idle = is_idle
+    return process
+
+tool2_broadcaster = MJPEGBroadcaster('tool2', make_tool2_frame_processor)
+
+def gen_tool2_frames():
+    return tool2_broadcaster.stream()
+
+stop_broadcaster_when_cleared('tool1.running', tool1_broadcaster)
+stop_broadcaster_when_cleared('tool2.running', tool2_broadcaster)
 
 @app.route('/')
 def home():
@@ -273,82 +329,91 @@ def tool5():
 def tool6():
     return render_template('tool6.html')
 
-def run_gesture_script():
-    """Function to be run in a separate thread to manage the subprocess."""
-    global gesture_process
-    script_path = os.path.join(os.path.dirname(__file__), 'tools', 'tool1_gesture_launcher.py')
-    print(f"Attempting to start gesture script: {script_path}", file=sys.stderr)
-    try:
-
-        if sys.platform == "win32":
-            gesture_process = subprocess.Popen(['python', script_path])
-        else:
-            gesture_process = subprocess.Popen(['python', script_path])
-        
-        print(f"Gesture process started with PID: {gesture_process.pid}", file=sys.stderr)
-        gesture_process.wait() # Wait for the subprocess to complete
-        print("Gesture process finished.", file=sys.stderr)
-    except Exception as e:
-        print(f"Error running gesture script: {e}", file=sys.stderr)
-    finally:
-        with process_lock:
-            gesture_process = None # Reset process handle when it's done
-
 @app.route('/start_gesture', methods=['POST'])
 def start_gesture():
-    global tool1_gesture_running
-    with tool1_gesture_lock:
-        if not tool1_gesture_running:
-            tool1_gesture_running = True
-            return jsonify({'status': 'success', 'msg': '🟢 Gesture detection started! Show your hand gestures to the camera.'})
-        else:
-            return jsonify({'status': 'running', 'msg': '🟡 Gesture detection already running.'})
+    if claim('tool1.running'):
+        return jsonify({'status': 'success', 'msg': '🟢 Gesture detection started! Show your hand gestures to the camera.'})
+    else:
+        return jsonify({'status': 'running', 'msg': '🟡 Gesture detection already running.'})
 
 @app.route('/stop_gesture', methods=['POST'])
 def stop_gesture():
-    global tool1_gesture_running
-    with tool1_gesture_lock:
-        tool1_gesture_running = False
+    state_store.set('tool1.running', None)
+    tool1_broadcaster.stop()
     return jsonify({'status': 'success', 'msg': '🔴 Gesture detection stopped.'})
 
 # Route to stream the video feed for tool1 gesture detection
 @app.route('/gesture_video_feed')
 def gesture_video_feed():
-    global tool1_gesture_running
-    with tool1_gesture_lock:
-        if not tool1_gesture_running:
-            tool1_gesture_running = True
+    claim('tool1.running')
     return Response(gen_tool1_gesture_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/run_tool2', methods=['POST'])
 def run_tool2():
-    global tool2_video_running
-    with tool2_video_lock:
-        if not tool2_video_running:
-            tool2_video_running = True
-            return jsonify({'status': 'success', 'msg': 'Gun Detector started. Camera feed below.'})
-        else:
-            return jsonify({'status': 'running', 'msg': 'Gun Detector already running.'})
+    if claim('tool2.running'):
+        return jsonify({'status': 'success', 'msg': 'Gun Detector started. Camera feed below.'})
+    else:
+        return jsonify({'status': 'running', 'msg': 'Gun Detector already running.'})
 
 
 
 # Route to stream the video feed for tool2
 @app.route('/tool2_video_feed')
 def tool2_video_feed():
-    global tool2_video_running
-    with tool2_video_lock:
-        if not tool2_video_running:
-            tool2_video_running = True
+    claim('tool2.running')
     return Response(gen_tool2_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # Route to stop the video feed for tool2
 @app.route('/stop_tool2', methods=['POST'])
 def stop_tool2():
-    global tool2_video_running
-    with tool2_video_lock:
-        tool2_video_running = False
+    state_store.set('tool2.running', None)
+    tool2_broadcaster.stop()
     return jsonify({'status': 'stopped', 'msg': 'Gun Detector stopped.'})
 
+# Capture, inference and stream rates, for tuning DETECTION_WORKERS
+@app.route('/pipeline_stats')
+def pipeline_stats():
+    return jsonify({
+        'detection': get_detection_worker().stats(),
+        'tool1': tool1_broadcaster.stats(),
+        'tool2': tool2_broadcaster.stats(),
+        'actions': get_action_dispatcher().stats(),
+        'audio': audio_mixer.stats(),
+        'stages': {name: tracer.snapshot() for name, tracer in all_tracers().items()},
+    })
+
+# Stage latency summaries and stream rates for Prometheus (STAGE_TRACING=0 disables the summaries)
+@app.route('/metrics')
+def metrics():
+    detection = get_detection_worker().stats()
+    broadcasters = [tool1_broadcaster, tool2_broadcaster]
+    gauges = [
+        ('vision_stream_fps', 'Frames per second published to viewers',
+         [({'pipeline': b.name}, round(b.stream_rate.rate(), 2)) for b in broadcasters]),
+        ('vision_stream_viewers', 'Connected stream viewers',
+         [({'pipeline': b.name}, len(b.viewers)) for b in broadcasters]),
+        ('vision_pipeline_dropped_frames', 'Frames dropped from full stage queues',
+         [({'pipeline': b.name, 'stage': stage.name}, stage.dropped)
+          for b, pipeline in ((b, b.pipeline) for b in broadcasters) if pipeline for stage in pipeline.stages]),
+        ('vision_capture_fps', 'Camera frames per second', [({}, detection['capture_fps'])]),
+        ('vision_inference_fps', 'Hand detections per second', [({}, detection['inference_fps'])]),
+    ]
+    cache = detection['landmark_cache']
+    if cache:
+        gauges += [
+            ('vision_landmark_cache_hit_ratio', 'Share of landmark lookups served from the cache',
+             [({}, cache['hit_rate'] or 0)]),
+            ('vision_landmark_cache_saved_seconds', 'Inference time saved by landmark cache hits',
+             [({}, cache['saved_ms'] / 1000)]),
+            ('vision_landmark_cache_entries', 'Frames held in the landmark cache', [({}, cache['entries'])]),
+        ]
+    return Response(prometheus_text(gauges), mimetype='text/plain; version=0.0.4')
+
+# Capture state and time since the last good frame
+@app.route('/camera_status')
+def camera_status():
+    return jsonify(get_camera().status())
+
 @app.route('/tool3_upload', methods=['POST'])
 def tool3_upload():
     if 'image' not in request.files:
@@ -358,45 +423,143 @@ def tool3_upload():
         return jsonify({'status': 'error', 'msg': 'No selected file'})
     filename = secure_filename(file.filename)
     save_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(save_path)
+    # Written beside the target and renamed into place, so a concurrent
+    # upload with the same name never reads half a file
+    tmp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    file.save(tmp_path)
+    image = cv2.imread(tmp_path)
+    if image is None:
+        os.remove(tmp_path)
+        return jsonify({'status': 'error', 'msg': 'Could not read the image; upload a JPEG or PNG file'})
+    os.replace(tmp_path, save_path)
+    uploaded = time.time()
+    # Every upload gets its own tile directory, so builders never share one
+    pyramid_dir = f"{save_path}.{int(uploaded * 1000)}.pyramid"
+    state_store.set('tool3.image', {'path': save_path, 'uploaded': uploaded, 'pyramid': pyramid_dir})
+    # Write the zoom tiles off the request; /tool3_view works from the image
+    # itself until they are ready
+    threading.Thread(target=save_tool3_pyramid, args=(image, save_path, pyramid_dir), daemon=True).start()
     # No need to launch the zoom tool script anymore
-    return jsonify({'status': 'success', 'msg': '🟢 Image uploaded and previewed below. Use the zoom controls.'})
+    return jsonify({'status': 'success', 'msg': '🟢 Image uploaded and previewed below. Use the zoom controls.',
+                    'version': uploaded})
+
+def save_tool3_pyramid(image, path, directory):
+    """Write the tiles for one upload, then drop those of uploads it replaced"""
+    try:
+        ImagePyramid.build(image).save(directory)
+    except OSError as e:
+        print(f"Could not save the zoom pyramid for {os.path.basename(path)}: {e}", file=sys.stderr)
+    current = (state_store.get('tool3.image') or {}).get('pyramid')
+    for old in glob.glob(glob.escape(path) + '.*.pyramid'):
+        # Builders still writing clean up after themselves when they finish
+        if old != current and (old == directory or ImagePyramid.saved(old)):
+            shutil.rmtree(old, ignore_errors=True)
+
+def get_tool3_pyramid():
+    """Pyramid of the last upload, read from its saved tiles once they exist"""
+    image = state_store.get('tool3.image')
+    if image is None:
+        return None
+    key = (image['path'], image['uploaded'])
+    # Uploads recorded before tiles got a directory per upload have none
+    directory = image.get('pyramid', image['path'] + '.pyramid')
+    with tool3_pyramid_lock:
+        if tool3_pyramid['key'] == key and (tool3_pyramid['tiles'] or not ImagePyramid.saved(directory)):
+            return tool3_pyramid['pyramid']
+        if ImagePyramid.saved(directory):
+            pyramid, tiles = ImagePyramid.load(directory), True
+        else:
+            decoded = cv2.imread(image['path'])
+            if decoded is None:
+                return None
+            pyramid, tiles = ImagePyramid.build(decoded), False
+        tool3_pyramid.update(key=key, pyramid=pyramid, tiles=tiles)
+        return pyramid
 
 def run_tool3_hand_tracking():
-    global tool3_zoom_scale, tool3_zoom_running
-    from cvzone.HandTrackingModule import HandDetector
-    import cv2
-    import numpy as np
-
-    cap = cv2.VideoCapture(0)
-    detector = HandDetector(detectionCon=0.8, maxHands=1)
-    tool3_zoom_running = True
-    while tool3_zoom_running:
-        success, img = cap.read()
-        if not success:
-            continue
-        img = cv2.flip(img, 1)
-        hands, _ = detector.findHands(img)
-        if hands:
-            hand = hands[0]
-            lmList = hand['lmList']
-            x1, y1 = lmList[4][0], lmList[4][1]
-            x2, y2 = lmList[8][0], lmList[8][1]
-            length, _, _ = detector.findDistance((x1, y1), (x2, y2), img)
-            scale = np.interp(length, [50, 300], [0.5, 3.0])
-            tool3_zoom_scale = float(scale)
-        time.sleep(0.05)
-    cap.release()
+    camera = get_camera().acquire()
+    detection = get_detection_worker()
+    # Same detector settings and inference size as the detection pool, so a
+    # frame either side has already analysed comes out of the landmark cache
+    detector = default_detector(detection.max_hands)
+    inference_width = detection.inference_width
+    # With several hands in view, the one tracked longest controls the zoom
+    tracker = HandTracker()
+    tracer = get_tracer('tool3')
+    last_seq = 0
+    try:
+        # /tool3_stop_zoom on any worker clears the owner
+        while state_store.get('tool3.zoom_owner') == os.getpid():
+            packet = camera.wait_for_frame(last_seq)
+            if packet is None:
+                if not camera.running:
+                    # The capture gave up; stop instead of spinning until it is restarted
+                    print("Tool3 hand tracking stopped: camera capture failed", file=sys.stderr)
+                    break
+                continue
+            last_seq = packet.seq
+            trace = tracer.begin(packet.timestamp)
+            trace.mark('frame_age')
+            hands = cached_detect_hands(detector, packet.image, inference_width, True, (id(camera), packet.seq),
+                                        camera.replay)
+            trace.mark('find_hands')
+            hands = tracker.update(hands, packet.timestamp)
+            if hands:
+                length = pinch_distance(landmark_array(hands[:1])[0])[0]
+                # The shared camera runs at 1280x720; keep the pinch range
+                # calibrated for the 640px-wide default capture
+                length = length * 640.0 / packet.image.shape[1]
+                scale = np.interp(length, [50, 300], [0.5, 3.0])
+                live_values.publish('zoom', float(scale))
+            trace.mark('zoom')
+            trace.end()
+            time.sleep(0.05)
+    finally:
+        camera.release()
+        state_store.compare_and_set('tool3.zoom_owner', os.getpid(), None)
+
+# Server-side zoomed view of the uploaded image, e.g. /tool3_view?scale=2.5
+# (defaults to the current gesture zoom scale and a 1280x720 viewport).
+# With fit=1 the scale is relative to the whole image fitting the viewport,
+# as on the tool3 page; otherwise 1.0 shows the image at full resolution
+@app.route('/tool3_view')
+def tool3_view():
+    pyramid = get_tool3_pyramid()
+    if pyramid is None:
+        return jsonify({'status': 'error', 'msg': 'No image uploaded'}), 404
+    try:
+        scale = float(request.args.get('scale', live_values.get('zoom')))
+        width = int(request.args.get('w', 1280))
+        height = int(request.args.get('h', 720))
+    except ValueError:
+        return jsonify({'status': 'error', 'msg': 'scale, w and h must be numbers'}), 400
+    if not math.isfinite(scale):
+        return jsonify({'status': 'error', 'msg': 'scale must be finite'}), 400
+    scale = float(np.clip(scale, 0.05, 10.0))
+    width = int(np.clip(width, 1, TOOL3_MAX_VIEW))
+    height = int(np.clip(height, 1, TOOL3_MAX_VIEW))
+    if request.args.get('fit') == '1':
+        scale *= min(width / pyramid.width, height / pyramid.height)
+    view = pyramid.render(scale, (width, height))
+    ret, buffer = cv2.imencode('.jpg', view)
+    return Response(buffer.tobytes(), mimetype='image/jpeg')
 
 @app.route('/tool3_zoom_scale')
 def tool3_zoom_scale_api():
-    return jsonify({'scale': tool3_zoom_scale})
+    return jsonify({'scale': live_values.get('zoom')})
+
+# Server-Sent Events stream of zoom/volume changes, e.g. /events?names=zoom
+@app.route('/events')
+def events():
+    names = request.args.get('names')
+    names = set(names.split(',')) if names else None
+    return Response(live_values.stream(names), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/tool3_start_zoom', methods=['POST'])
 def tool3_start_zoom():
-    global tool3_zoom_thread, tool3_zoom_running
-    if tool3_zoom_thread is None or not tool3_zoom_thread.is_alive():
-        tool3_zoom_running = True
+    global tool3_zoom_thread
+    if claim('tool3.zoom_owner'):
         tool3_zoom_thread = threading.Thread(target=run_tool3_hand_tracking)
         tool3_zoom_thread.daemon = True
         tool3_zoom_thread.start()
@@ -406,39 +569,21 @@ def tool3_start_zoom():
 
 @app.route('/tool3_stop_zoom', methods=['POST'])
 def tool3_stop_zoom():
-    global tool3_zoom_running
-    tool3_zoom_running = False
+    state_store.set('tool3.zoom_owner', None)
     return jsonify({'status': 'stopped'})
 
 # Tool4 Face Detection Routes
 @app.route('/start_face_detection', methods=['POST'])
 def start_face_detection():
-    global tool4_face_process, tool4_face_thread
-    if tool4_face_process is None or tool4_face_process.poll() is not None:
-        tool4_face_thread = threading.Thread(target=run_tool4_face_detection)
-        tool4_face_thread.daemon = True
-        tool4_face_thread.start()
+    if tool_supervisor.start('tool4_face'):
         return jsonify({'status': 'success', 'msg': '🟢 Face detection starting... (Check desktop for camera feed)'})
     else:
         return jsonify({'status': 'running', 'msg': '🟡 Face detection already running.'})
 
 @app.route('/stop_face_detection', methods=['POST'])
 def stop_face_detection():
-    global tool4_face_process
-    if tool4_face_process and tool4_face_process.poll() is None:
-        try:
-            if sys.platform == "win32":
-                tool4_face_process.terminate()
-            else:
-                tool4_face_process.send_signal(signal.SIGINT)
-            tool4_face_process.wait(timeout=5)
-            print("Face detection process terminated.", file=sys.stderr)
-        except subprocess.TimeoutExpired:
-            tool4_face_process.kill()
-        except Exception as e:
-            print(f"Error during face detection termination: {e}", file=sys.stderr)
-        
-        tool4_face_process = None
+    if tool_supervisor.stop('tool4_face'):
+        print("Face detection process terminated.", file=sys.stderr)
         return jsonify({'status': 'success', 'msg': 'Face detection stopped.'})
     else:
         return jsonify({'status': 'stopped', 'msg': 'Face detection is not running.'})
@@ -446,122 +591,164 @@ def stop_face_detection():
 # Tool5 Volume Control Routes
 @app.route('/start_volume_control', methods=['POST'])
 def start_volume_control():
-    global tool5_volume_thread, tool5_volume_running
-    if not tool5_volume_running:
-        tool5_volume_running = True
-        tool5_volume_thread = threading.Thread(target=run_tool5_volume_control)
-        tool5_volume_thread.daemon = True
-        tool5_volume_thread.start()
+    if tool_supervisor.start('tool5_volume'):
         return jsonify({'status': 'success', 'msg': '🟢 Volume control starting... Use hand gestures!'})
     else:
         return jsonify({'status': 'running', 'msg': '🟡 Volume control already running.'})
 
 @app.route('/stop_volume_control', methods=['POST'])
 def stop_volume_control():
-    global tool5_volume_running
-    tool5_volume_running = False
+    tool_supervisor.stop('tool5_volume')
     return jsonify({'status': 'stopped', 'msg': 'Volume control stopped.'})
 
+# Uniform control of the desktop tool workers, e.g. POST /tools/tool4_face/start
+@app.route('/tools/<name>/<action>', methods=['GET', 'POST'])
+def tool_worker_control(name, action):
+    if name not in tool_supervisor.workers:
+        return jsonify({'status': 'error', 'msg': f'Unknown tool {name}'}), 404
+    if action == 'start' and request.method == 'POST':
+        started = tool_supervisor.start(name)
+        return jsonify({'status': 'success' if started else 'running', 'tool': tool_supervisor.status(name)})
+    if action == 'stop' and request.method == 'POST':
+        stopped = tool_supervisor.stop(name)
+        return jsonify({'status': 'success' if stopped else 'stopped', 'tool': tool_supervisor.status(name)})
+    if action == 'status':
+        return jsonify(tool_supervisor.status(name))
+    return jsonify({'status': 'error', 'msg': f'Unknown action {action}'}), 404
+
+@app.route('/tools/status')
+def tool_workers_status():
+    return jsonify(tool_supervisor.status())
+
 @app.route('/get_volume_level')
 def get_volume_level():
-    global current_volume
     # In a real implementation, you would get the actual system volume
     # For now, return a simulated value
-    return jsonify({'volume': current_volume})
+    return jsonify({'volume': live_values.get('volume')})
 
 # Tool6 Voice Assistant Routes
-try:
-    from tools.tool6_voice_assistance import start_voice_assistant, stop_voice_assistant, is_assistant_running
-    
-    @app.route('/start_voice_assistant', methods=['POST'])
-    def start_voice_assistant_route():
-        try:
-            if start_voice_assistant():
-                return jsonify({'status': 'success', 'msg': '🟢 Voice assistant started! You can now speak commands.'})
-            else:
-                return jsonify({'status': 'running', 'msg': '🟡 Voice assistant is already running.'})
-        except Exception as e:
-            return jsonify({'status': 'error', 'msg': f'Error starting voice assistant: {str(e)}'})
-    
-    @app.route('/stop_voice_assistant', methods=['POST'])
-    def stop_voice_assistant_route():
-        try:
-            if stop_voice_assistant():
-                return jsonify({'status': 'success', 'msg': '🔴 Voice assistant stopped.'})
-            else:
-                return jsonify({'status': 'stopped', 'msg': 'Voice assistant was not running.'})
-        except Exception as e:
-            return jsonify({'status': 'error', 'msg': f'Error stopping voice assistant: {str(e)}'})
-    
-    @app.route('/voice_assistant_status')
-    def voice_assistant_status():
+# speech_recognition and pyttsx3 are imported on first use of these routes
+voice_assistant_state = {'module': None, 'error': None}
+
+def voice_assistant_module():
+    """tools.tool6_voice_assistance, or None if its dependencies are missing"""
+    if voice_assistant_state['module'] is None and voice_assistant_state['error'] is None:
         try:
-            running = is_assistant_running()
-            status_msg = "Listening for voice commands..." if running else "Voice assistant is stopped"
-            return jsonify({'running': running, 'status': status_msg})
-        except Exception as e:
-            return jsonify({'running': False, 'status': f'Error: {str(e)}'})
-
-except ImportError as e:
-    print(f"Voice assistant import error: {e}")
-    
-    @app.route('/start_voice_assistant', methods=['POST'])
-    def start_voice_assistant_route():
+            from tools import tool6_voice_assistance
+            voice_assistant_state['module'] = tool6_voice_assistance
+        except ImportError as e:
+            voice_assistant_state['error'] = e
+            print(f"Voice assistant import error: {e}")
+    return voice_assistant_state['module']
+
+@app.route('/start_voice_assistant', methods=['POST'])
+def start_voice_assistant_route():
+    voice = voice_assistant_module()
+    if voice is None:
         return jsonify({'status': 'error', 'msg': 'Voice assistant dependencies not installed. Please install: pip install speechrecognition pyttsx3 pyaudio'})
-    
-    @app.route('/stop_voice_assistant', methods=['POST'])
-    def stop_voice_assistant_route():
+    # Only one worker may own the microphone
+    if not claim('voice.owner'):
+        return jsonify({'status': 'running', 'msg': '🟡 Voice assistant is already running.'})
+    try:
+        voice.start_voice_assistant()
+    except Exception as e:
+        state_store.set('voice.owner', None)
+        return jsonify({'status': 'error', 'msg': f'Error starting voice assistant: {str(e)}'})
+    py_threading.Thread(target=release_voice_owner, args=(voice.assistant_thread,), daemon=True).start()
+    return jsonify({'status': 'success', 'msg': '🟢 Voice assistant started! You can now speak commands.'})
+
+def release_voice_owner(thread):
+    # The assistant also stops itself on "goodbye"
+    thread.join()
+    state_store.compare_and_set('voice.owner', os.getpid(), None)
+
+def stop_local_voice_assistant(owner):
+    # Runs in every worker; the one whose assistant was stopped elsewhere stops it
+    voice = voice_assistant_state['module']
+    if owner != os.getpid() and voice is not None and voice.is_assistant_running():
+        voice.stop_voice_assistant()
+
+state_store.subscribe('voice.owner', stop_local_voice_assistant)
+
+@app.route('/stop_voice_assistant', methods=['POST'])
+def stop_voice_assistant_route():
+    voice = voice_assistant_module()
+    if voice is None:
         return jsonify({'status': 'error', 'msg': 'Voice assistant not available'})
-    
-    @app.route('/voice_assistant_status')
-    def voice_assistant_status():
+    try:
+        owner = owner_alive('voice.owner')
+        state_store.set('voice.owner', None)
+        if owner is None:
+            return jsonify({'status': 'stopped', 'msg': 'Voice assistant was not running.'})
+        if owner == os.getpid():
+            voice.stop_voice_assistant()
+        return jsonify({'status': 'success', 'msg': '🔴 Voice assistant stopped.'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': f'Error stopping voice assistant: {str(e)}'})
+
+@app.route('/voice_assistant_status')
+def voice_assistant_status():
+    voice = voice_assistant_module()
+    if voice is None:
         return jsonify({'running': False, 'status': 'Voice assistant dependencies not installed'})
+    try:
+        running = owner_alive('voice.owner') is not None
+        status_msg = "Listening for voice commands..." if running else "Voice assistant is stopped"
+        return jsonify({'running': running, 'status': status_msg})
+    except Exception as e:
+        return jsonify({'running': False, 'status': f'Error: {str(e)}'})
 
 # Add error handler for 404
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404 if os.path.exists('templates/404.html') else ('Page not found', 404)
 
+# Import-time profile of a cold start: flask --app app import-report
+@app.cli.command('import-report')
+@click.option('--top', default=20, help='Number of slowest imports to list.')
+def import_report_command(top):
+    """Show which imports `import app` spends its startup time on."""
+    total, rows = import_report('import app', cwd=os.path.dirname(os.path.abspath(__file__)), top=top)
+    click.echo(f"import app: {total * 1000:.0f} ms")
+    click.echo(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, own, name in rows:
+        click.echo(f"{cumulative / 1000:14.1f} {own / 1000:9.1f}  {name}")
+
+def warm_up_tools():
+    """Load tool dependencies in the background once the server is up"""
+    start = time.time()
+    errors = warm_up(['numpy', 'cv2', 'cvzone.HandTrackingModule', 'tools.tool6_voice_assistance'])
+    for name, error in errors.items():
+        print(f"Warm-up could not load {name}: {error}", file=sys.stderr)
+    load_fire_sound()
+    tool_supervisor.warm_up()
+    print(f"Warm-up finished in {time.time() - start:.1f}s", file=sys.stderr)
+
+# The warm-up starts with the first request, so CLI commands and the debug
+# reloader's parent process never pay for it. APP_WARMUP=0 disables it.
+warm_up_state = {'started': False}
+
+@app.before_request
+def start_warm_up():
+    if not warm_up_state['started']:
+        warm_up_state['started'] = True
+        if os.environ.get('APP_WARMUP', '1') != '0':
+            py_threading.Thread(target=warm_up_tools, name='warm-up', daemon=True).start()
+
 if __name__ == '__main__':
     # Ensure all OpenCV windows are closed if the server is stopped
 
     def shutdown_server(signal, frame):
-        global gesture_process, tool1_gesture_running, tool2_video_running, tool4_face_process, tool5_volume_running
-        
         # Stop tool1 gesture detection
-        tool1_gesture_running = False
+        state_store.set('tool1.running', None)
+        tool1_broadcaster.stop()
         
-        with process_lock:
-            if gesture_process and gesture_process.poll() is None:
-                print("Server shutting down, attempting to terminate gesture process.", file=sys.stderr)
-                try:
-                    if sys.platform == "win32":
-                        gesture_process.terminate()
-                    else:
-                        gesture_process.send_signal(signal.SIGINT)
-                    gesture_process.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    gesture_process.kill()
-                except Exception as e:
-                    print(f"Error during server shutdown termination: {e}", file=sys.stderr)
-            
-            # Stop face detection process
-            if tool4_face_process and tool4_face_process.poll() is None:
-                print("Terminating face detection process.", file=sys.stderr)
-                try:
-                    if sys.platform == "win32":
-                        tool4_face_process.terminate()
-                    else:
-                        tool4_face_process.send_signal(signal.SIGINT)
-                    tool4_face_process.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    tool4_face_process.kill()
-                except Exception as e:
-                    print(f"Error during face detection shutdown: {e}", file=sys.stderr)
+        # Stop the desktop tools and their warm workers
+        tool_supervisor.shutdown()
         
-        # Also stop tool2 video stream and tool5 volume control on shutdown
-        tool2_video_running = False
-        tool5_volume_running = False
+        # Also stop tool2 video stream on shutdown
+        state_store.set('tool2.running', None)
+        tool2_broadcaster.stop()
         print("Flask server shutting down.", file=sys.stderr)
         sys.exit(0)
 
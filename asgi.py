@@ -0,0 +1,96 @@
+"""
+ASGI entry point - event-loop delivery for the long-lived streams
+The MJPEG feeds and the /events stream are served straight from the event
+loop: capture, inference and JPEG encoding stay on the broadcaster threads,
+and each viewer is just a coroutine waiting for the next frame, so hundreds
+of viewers need no extra threads. Every other route runs the Flask app on a
+small thread pool (a2wsgi).
+
+Usage (needs `pip install uvicorn a2wsgi`):
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --timeout-graceful-shutdown 5
+
+Open streams never finish by themselves, so without a graceful-shutdown
+timeout uvicorn waits for the viewers to leave before stopping.
+
+Viewers are served one frame at a time: the next frame is only taken once
+the previous one has been written, so a slow client skips frames and steps
+down the quality ladder instead of buffering.
+"""
+
+import asyncio
+import os
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+from app import app, claim, live_values, tool1_broadcaster, tool2_broadcaster, tool_supervisor
+
+# path -> (broadcaster, running flag set by the matching Flask route)
+MJPEG_STREAMS = {
+    '/gesture_video_feed': (tool1_broadcaster, 'tool1.running'),
+    '/tool2_video_feed': (tool2_broadcaster, 'tool2.running'),
+}
+
+wsgi_application = WSGIMiddleware(app, workers=int(os.environ.get('ASGI_WSGI_THREADS', '10')))
+
+
+async def stream_response(send, receive, chunks, content_type, headers=()):
+    """Send each chunk of the async iterator `chunks` until the client leaves"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', content_type)] + list(headers),
+    })
+
+    async def deliver():
+        async for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    delivery = asyncio.ensure_future(deliver())
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait([delivery, watcher], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (delivery, watcher):
+            task.cancel()
+        await asyncio.gather(delivery, watcher, return_exceptions=True)
+        # Detaches the viewer from its broadcaster
+        await chunks.aclose()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            tool1_broadcaster.stop()
+            tool2_broadcaster.stop()
+            tool_supervisor.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    path = scope.get('path')
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        if path in MJPEG_STREAMS:
+            broadcaster, running_key = MJPEG_STREAMS[path]
+            claim(running_key)
+            return await stream_response(send, receive, broadcaster.stream_async(),
+                                         b'multipart/x-mixed-replace; boundary=frame')
+        if path == '/events':
+            names = parse_qs(scope['query_string'].decode()).get('names')
+            names = set(names[0].split(',')) if names else None
+            return await stream_response(send, receive, live_values.stream_async(names), b'text/event-stream',
+                                         [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')])
+    await wsgi_application(scope, receive, send)
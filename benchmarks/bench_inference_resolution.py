@@ -0,0 +1,99 @@
+"""
+Benchmark - hand detection latency and accuracy at reduced inference widths
+Runs HandDetector on every frame of a recorded clip at full resolution and at
+each requested inference width, then reports the latency per width and how
+far the re-projected landmarks and gesture decisions drift from full size.
+
+Usage:
+    python benchmarks/bench_inference_resolution.py clip.mp4 --widths 320 480 640
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.detection_worker import default_detector, detect_hands, fingers_up, is_gun_pose
+
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        success, img = cap.read()
+        if not success:
+            break
+        frames.append(img)
+    cap.release()
+    return frames
+
+
+def run(frames, width):
+    """Return per-frame (hands, seconds) for one inference width"""
+    detector = default_detector()
+    # Warm up so graph initialisation doesn't count against the first frame
+    detect_hands(detector, frames[0], width)
+    results = []
+    for img in frames:
+        start = time.perf_counter()
+        hands = detect_hands(detector, img, width)
+        results.append((hands, time.perf_counter() - start))
+    return results
+
+
+def compare(reference, results):
+    errors = []
+    detected = fingers_match = gun_match = 0
+    both = 0
+    for (ref_hands, _), (hands, _) in zip(reference, results):
+        if bool(ref_hands) == bool(hands):
+            detected += 1
+        if ref_hands and hands:
+            both += 1
+            ref_lm = np.array(ref_hands[0]['lmList'], dtype=np.float32)[:, :2]
+            lm = np.array(hands[0]['lmList'], dtype=np.float32)[:, :2]
+            errors.append(np.linalg.norm(ref_lm - lm, axis=1).mean())
+            fingers_match += fingers_up(ref_hands[0]) == fingers_up(hands[0])
+            gun_match += is_gun_pose(ref_hands[0]) == is_gun_pose(hands[0])
+    return {
+        'detection_agreement': detected / len(reference),
+        'mean_landmark_error_px': float(np.mean(errors)) if errors else float('nan'),
+        'fingers_agreement': fingers_match / both if both else float('nan'),
+        'gun_pose_agreement': gun_match / both if both else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clip', help="recorded video clip")
+    parser.add_argument('--widths', type=int, nargs='+', default=[320, 480, 640])
+    parser.add_argument('--frames', type=int, default=300, help="maximum frames to use")
+    args = parser.parse_args()
+
+    frames = load_frames(args.clip, args.frames)
+    if not frames:
+        sys.exit(f"No frames could be read from {args.clip}")
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames at {w}x{h}")
+
+    reference = run(frames, 0)
+    ref_ms = np.array([t for _, t in reference]) * 1000
+
+    print(f"{'width':>8} {'mean ms':>9} {'p95 ms':>8} {'speedup':>8} {'detect':>8} {'lm err px':>10} {'fingers':>8} {'gun':>8}")
+    print(f"{'full':>8} {ref_ms.mean():9.2f} {np.percentile(ref_ms, 95):8.2f} {1.0:8.2f} {1.0:8.1%} {0.0:10.2f} {1.0:8.1%} {1.0:8.1%}")
+    for width in args.widths:
+        results = run(frames, width)
+        ms = np.array([t for _, t in results]) * 1000
+        acc = compare(reference, results)
+        print(f"{width:>8} {ms.mean():9.2f} {np.percentile(ms, 95):8.2f} {ref_ms.mean() / ms.mean():8.2f} "
+              f"{acc['detection_agreement']:8.1%} {acc['mean_landmark_error_px']:10.2f} "
+              f"{acc['fingers_agreement']:8.1%} {acc['gun_pose_agreement']:8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark - full-frame vs ROI mosaic hand detection by number of hands
+Takes the frames of a recording (tools/recording.py) that show a hand and
+pastes copies of the hand's region across the frame, so each frame shows 1 to
+N hands. For every hand count it times the detection pool's two passes: a
+full-frame findHands (maxHands=N, at the pool's inference width) and the ROI
+pass, which re-detects every tracked hand in one mosaic of their crops
+(tools/detection_worker.py detect_in_rois). Reports latency per frame and
+per hand, and how many of the pasted hands each pass finds.
+
+Usage:
+    python benchmarks/bench_multi_hand.py clips/wave.rec --hands 1 2 3 4
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.detection_worker import default_detector, detect_hands, detect_in_rois
+from tools.hand_tracker import HandTracker
+from tools.recording import Recording
+
+
+def hand_regions(recording, limit):
+    """(display frame, (x0, y0, x1, y1)) for frames showing a hand, as the tracker would crop it"""
+    detector = None
+    regions = []
+    for index in range(len(recording)):
+        if len(regions) >= limit:
+            break
+        img = recording.frame(index)
+        hands = recording.hands(index) if recording.has_landmarks else None
+        if hands is None:
+            detector = detector or default_detector()
+            hands = detect_hands(detector, img)
+        if not hands:
+            continue
+        h, w = img.shape[:2]
+        tracker = HandTracker()
+        tracker.update(hands[:1], 0.0)
+        rois = tracker.rois(w, h, 0.0)
+        if rois:
+            regions.append((cv2.flip(img, 1), rois[0][1]))
+    return regions
+
+
+def composite(display, roi, count):
+    """Camera frame with `count` copies of the hand region, and their ROIs"""
+    h, w = display.shape[:2]
+    x0, y0, x1, y1 = roi
+    crop = display[y0:y1, x0:x1]
+    cols = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / cols)
+    cell_w, cell_h = w // cols, h // rows
+    scale = min(cell_w / crop.shape[1], cell_h / crop.shape[0], 1.0)
+    if scale < 1.0:
+        crop = cv2.resize(crop, (int(crop.shape[1] * scale), int(crop.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    out = display.copy()
+    rois = []
+    for i in range(count):
+        left = i % cols * cell_w + (cell_w - crop.shape[1]) // 2
+        top = i // cols * cell_h + (cell_h - crop.shape[0]) // 2
+        out[top:top + crop.shape[0], left:left + crop.shape[1]] = crop
+        rois.append((left, top, left + crop.shape[1], top + crop.shape[0]))
+    # Detectors take camera frames and mirror them
+    return cv2.flip(out, 1), rois
+
+
+def run(regions, count, inference_width, roi_width):
+    """Per-frame (seconds, hands found) for the full-frame and ROI passes"""
+    frames = [composite(display, roi, count) for display, roi in regions]
+    full_detector = default_detector(count)
+    roi_detector = default_detector(count)
+    # Warm up so graph initialisation doesn't count against the first frame
+    detect_hands(full_detector, frames[0][0], inference_width)
+    detect_in_rois(roi_detector, frames[0][0], frames[0][1], roi_width)
+    full, roi = [], []
+    for img, rois in frames:
+        start = time.perf_counter()
+        hands = detect_hands(full_detector, img, inference_width)
+        full.append((time.perf_counter() - start, len(hands)))
+        start = time.perf_counter()
+        found = detect_in_rois(roi_detector, img, rois, roi_width)
+        roi.append((time.perf_counter() - start, len(found)))
+    return full, roi
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help="recording directory (python -m tools.recording record ...)")
+    parser.add_argument('--hands', type=int, nargs='+', default=[1, 2, 3, 4])
+    parser.add_argument('--frames', type=int, default=200, help="maximum frames to use")
+    parser.add_argument('--inference-width', type=int, default=int(os.environ.get('INFERENCE_WIDTH', '480')),
+                        help="full-frame detection width (default: INFERENCE_WIDTH or 480)")
+    parser.add_argument('--roi-width', type=int, default=int(os.environ.get('HAND_ROI_WIDTH', '256')),
+                        help="mosaic cell size (default: HAND_ROI_WIDTH or 256)")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    regions = hand_regions(recording, args.frames)
+    recording.close()
+    if not regions:
+        sys.exit(f"No frame of {args.recording} shows a hand")
+    h, w = regions[0][0].shape[:2]
+    print(f"{len(regions)} frames with a hand at {w}x{h}")
+
+    print(f"{'hands':>6} {'full ms':>8} {'p95':>7} {'per hand':>9} {'found':>7} "
+          f"{'roi ms':>8} {'p95':>7} {'per hand':>9} {'found':>7} {'roi/full':>9}")
+    for count in args.hands:
+        full, roi = run(regions, count, args.inference_width, args.roi_width)
+        full_ms = np.array([t for t, _ in full]) * 1000
+        roi_ms = np.array([t for t, _ in roi]) * 1000
+        full_found = np.mean([n for _, n in full]) / count
+        roi_found = np.mean([n for _, n in roi]) / count
+        print(f"{count:>6} {np.median(full_ms):8.2f} {np.percentile(full_ms, 95):7.2f} {np.median(full_ms) / count:9.2f} "
+              f"{full_found:7.1%} {np.median(roi_ms):8.2f} {np.percentile(roi_ms, 95):7.2f} "
+              f"{np.median(roi_ms) / count:9.2f} {roi_found:7.1%} {np.median(roi_ms) / np.median(full_ms):9.2f}")
+
+
+if __name__ == '__main__':
+    main()
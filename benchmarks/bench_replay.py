@@ -0,0 +1,279 @@
+"""
+Benchmark - tool1/tool2/tool3 pipelines replayed from a recording
+Replays a recording (tools/recording.py) as the app's own camera
+(CAMERA_SOURCE=replay-fast:<dir>, or replay:<dir> with --realtime) and runs
+each tool the way the server does: tool1 and tool2 through their MJPEG
+broadcasters and frame processors (make_tool1_frame_processor,
+make_tool2_frame_processor) with one viewer attached, and tool3 through
+run_tool3_hand_tracking. Reports frames per second and p50/p95/p99 per stage
+for each tool and for the detection pool feeding tool1 and tool2.
+
+Nothing is launched or played: tool1's gesture triggers, tool2's shots and
+tool3's zoom updates are recorded instead. When the recording has landmarks,
+each tool is replayed again with a detector that answers with the stored
+landmarks, and the decisions of the two runs are compared. Decisions depend
+on timing, so compare them with --realtime. --detector recorded runs only the
+stored landmarks, for boxes without MediaPipe. --json writes the summary for
+CI.
+
+--repeat N replays the recording N times per tool, like a threshold-tuning
+session; from the second pass on, detections come out of the landmark cache
+(tools/landmark_cache.py) and its hit rate and saved inference time are
+reported. --no-cache runs the detector on every pass.
+
+Usage:
+    python -m tools.recording record clips/wave.rec --seconds 20
+    python benchmarks/bench_replay.py clips/wave.rec --realtime --inference-width 480
+"""
+
+import argparse
+import difflib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import detection_worker
+from tools.detection_worker import scale_hands
+from tools.landmark_cache import get_landmark_cache
+from tools.recording import Recording
+from tools.stage_tracer import get_tracer
+
+# The decisions each tool makes
+TOOLS = {'tool1': 'fired', 'tool2': 'shots', 'tool3': 'zoom'}
+
+
+def thumbnail(img):
+    grey = cv2.cvtColor(cv2.resize(img, (32, 18), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return grey.astype(np.float32).ravel()
+
+
+class RecordedDetector:
+    """Stands in for HandDetector, answering with the landmarks stored for the frame shown
+
+    Frames are recognised by their closest thumbnail, so the downscaled
+    copies the detection pool passes in are found too.
+    """
+
+    def __init__(self, recording, max_hands=1):
+        self.maxHands = max_hands
+        self.detectionCon = None
+        self.size = (recording.meta['width'], recording.meta['height'])
+        # findHands sees frames mirrored, like the stored landmarks
+        self.thumbnails = np.stack([thumbnail(cv2.flip(recording.frame(i), 1)) for i in range(len(recording))])
+        self.hands = [recording.hands(i) or [] for i in range(len(recording))]
+
+    def findHands(self, img, draw=False):
+        index = int(np.abs(self.thumbnails - thumbnail(img)).sum(axis=1).argmin())
+        h, w = img.shape[:2]
+        hands = scale_hands(self.hands[index], w / self.size[0], h / self.size[1])[:self.maxHands]
+        return (hands, img) if draw else hands
+
+
+class Decisions:
+    """What the tools decided during one replay, by recording frame"""
+
+    def __init__(self):
+        self.fired = []
+        self.shots = []
+        self.zoom = []
+
+
+class Session:
+    """Runs the app's tools on the replayed camera and records their decisions"""
+
+    def __init__(self, server, frames):
+        self.server = server
+        self.frames = frames
+        self.camera = server.get_camera()
+        self.detection = server.get_detection_worker()
+        self.decisions = Decisions()
+        self.start_seq = 0
+        # Gestures launch nothing and shots make no sound; they are only recorded
+        server.tool1_gestures.trigger = self._trigger
+        server.play_fire_sound = self._fire
+        server.live_values.publish = self._publish
+
+    def use_detector(self, make):
+        """Build every hand detector, in the detection pool and in tool3, with make(max_hands)"""
+        detection_worker.default_detector = make
+        self.server.default_detector = make
+
+    def run(self, tool, timeout):
+        """Replay the recording once through `tool`; returns the seconds it took"""
+        self.start_seq = self.camera.seq
+        started = time.monotonic()
+        if tool == 'tool3':
+            self.server.state_store.set('tool3.zoom_owner', os.getpid())
+            thread = threading.Thread(target=self.server.run_tool3_hand_tracking)
+        else:
+            broadcaster = getattr(self.server, f'{tool}_broadcaster')
+            thread = threading.Thread(target=self._view, args=(broadcaster,))
+        thread.start()
+        while self.camera.seq - self.start_seq < self.frames and time.monotonic() < started + timeout:
+            time.sleep(0.01)
+        elapsed = time.monotonic() - started
+        if tool == 'tool3':
+            self.server.state_store.set('tool3.zoom_owner', None)
+        else:
+            broadcaster.stop()
+            broadcaster.thread.join()
+        thread.join()
+        # The replay restarts from its first frame when the camera is next opened
+        if self.camera.thread is not None and not self.camera.running:
+            self.camera.thread.join()
+        return elapsed
+
+    def _view(self, broadcaster):
+        # One viewer reading every frame as soon as it is published
+        for _ in broadcaster.stream():
+            pass
+
+    def _frame(self, seq):
+        return (seq - self.start_seq - 1) % self.frames
+
+    def _trigger(self, fingers):
+        result = self.detection.latest()
+        self.decisions.fired.append((self._frame(result.seq), tuple(fingers)))
+        return None, None
+
+    def _fire(self, triggered_at=None):
+        self.decisions.shots.append(self._frame(self.detection.latest().seq))
+
+    def _publish(self, name, value):
+        if name == 'zoom':
+            self.decisions.zoom.append((self._frame(self.camera.seq), value))
+
+
+def agreement(replayed, reference):
+    """How closely the run on detected landmarks decided like the run on recorded ones"""
+    fired = [gesture for _, gesture in replayed.fired]
+    reference_fired = [gesture for _, gesture in reference.fired]
+    zoom_errors = []
+    if replayed.zoom and reference.zoom:
+        frames, values = zip(*sorted(reference.zoom))
+        zoom_errors = [abs(value - np.interp(frame, frames, values)) for frame, value in replayed.zoom]
+    return {
+        'tool1_fired_count': [len(fired), len(reference_fired)],
+        'tool1_fired_sequence': difflib.SequenceMatcher(None, fired, reference_fired).ratio()
+        if fired or reference_fired else 1.0,
+        'tool2_shot_count': [len(replayed.shots), len(reference.shots)],
+        'tool3_zoom_within_0.05': float(np.mean([e <= 0.05 for e in zoom_errors])) if zoom_errors else float('nan'),
+        'tool3_zoom_mean_error': float(np.mean(zoom_errors)) if zoom_errors else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help="recording directory")
+    parser.add_argument('--detector', choices=['live', 'recorded'], default='live',
+                        help="run HandDetector on each frame, or replay the recorded landmarks")
+    parser.add_argument('--inference-width', type=int, default=int(os.environ.get('INFERENCE_WIDTH', '480')))
+    parser.add_argument('--realtime', action='store_true', help="pace frames like the original capture")
+    parser.add_argument('--quality', type=int, default=80, help="JPEG quality")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the recording this many times per tool")
+    parser.add_argument('--no-cache', action='store_true', help="disable the landmark cache")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    if not len(recording):
+        sys.exit(f"{args.recording} has no frames")
+    if args.detector == 'recorded' and not recording.has_landmarks:
+        sys.exit(f"{args.recording} was recorded without landmarks")
+
+    # The app reads its settings at import; keep its state out of instance/
+    os.environ['CAMERA_SOURCE'] = f"{'replay' if args.realtime else 'replay-fast'}:{args.recording}"
+    os.environ['INFERENCE_WIDTH'] = str(args.inference_width)
+    os.environ['STATE_DB'] = os.path.join(tempfile.mkdtemp(prefix='bench-replay-'), 'state.sqlite3')
+    for tool in ('TOOL1', 'TOOL2'):
+        os.environ[f'{tool}_JPEG_QUALITY'] = str(args.quality)
+    if args.no_cache:
+        os.environ['LANDMARK_CACHE'] = '0'
+    import app as server
+
+    print(f"{len(recording)} frames at {recording.meta['width']}x{recording.meta['height']}, "
+          f"detector: {args.detector}")
+    modes = [args.detector]
+    if args.detector == 'live' and recording.has_landmarks:
+        modes.append('recorded')
+    live_detector = detection_worker.default_detector
+    session = Session(server, len(recording))
+    timeout = max(recording.duration() * 2, 10.0) + 30.0
+    cache = get_landmark_cache()
+    results = {'frames': len(recording), 'detector': args.detector, 'stages': {}, 'fps': {}, 'passes': {}}
+    decisions = {}
+
+    for mode in modes:
+        if mode == 'live':
+            session.use_detector(live_detector)
+        else:
+            detector = RecordedDetector(recording)
+            session.use_detector(lambda max_hands=1: detector)
+        decisions[mode] = Decisions()
+        for tool, decided in TOOLS.items():
+            if cache is not None:
+                # Each tool's first pass runs inference, not another tool's cache hits
+                cache.clear()
+            for i in range(max(args.repeat, 1)):
+                # The tables below describe the last pass
+                for name in (tool, 'detection'):
+                    get_tracer(name).reset()
+                session.decisions = Decisions()
+                broadcaster = getattr(server, f'{tool}_broadcaster', None)
+                encoded = broadcaster.frames_encoded if broadcaster else 0
+                elapsed = session.run(tool, timeout)
+                if mode != modes[0]:
+                    continue
+                if broadcaster is not None:
+                    fps = (broadcaster.frames_encoded - encoded) / elapsed
+                else:
+                    fps = get_tracer(tool).snapshot().get('total', {}).get('count', 0) / elapsed
+                results['passes'].setdefault(tool, []).append(round(fps, 1))
+                print(f"{tool} pass {i + 1}: {fps:.1f} fps over {elapsed:.1f}s")
+            setattr(decisions[mode], decided, getattr(session.decisions, decided))
+            if mode == modes[0]:
+                results['fps'][tool] = results['passes'][tool][-1]
+                results['stages'][tool] = get_tracer(tool).snapshot()
+                if tool != 'tool3':
+                    results['stages'][f'{tool}.detection'] = get_tracer('detection').snapshot()
+        if mode == modes[0] and cache is not None:
+            results['landmark_cache'] = stats = cache.stats()
+            print(f"landmark cache: {stats['hits']} hits / {stats['misses']} misses "
+                  f"(hit rate {stats['hit_rate'] or 0:.1%}), {stats['saved_ms'] / 1000:.2f}s inference saved")
+
+    print(f"{'pipeline':>16} {'stage':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stages in results['stages'].items():
+        for stage, stats in stages.items():
+            if 'p50' in stats:
+                print(f"{name:>16} {stage:>11} {stats['p50']:8.2f} {stats['p95']:8.2f} {stats['p99']:8.2f}")
+    print("fps (detection included): " + ", ".join(f"{k} {v}" for k, v in results['fps'].items()))
+
+    if len(modes) > 1:
+        results['agreement'] = agreement(decisions['live'], decisions['recorded'])
+        print("decision agreement with the recorded landmarks" + ("" if args.realtime else " (use --realtime)") + ":")
+        for key, value in results['agreement'].items():
+            if isinstance(value, list):
+                text = f"{value[0]} replayed / {value[1]} recorded"
+            elif key.endswith('error'):
+                text = f"{value:.3f}"
+            else:
+                text = f"{value:.1%}"
+            print(f"  {key}: {text}")
+    elif not recording.has_landmarks:
+        print("recording has no landmarks; decision agreement skipped")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
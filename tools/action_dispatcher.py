@@ -0,0 +1,112 @@
+"""
+Action Dispatcher - side effects off the frame and listen loops
+Browser launches, sounds and app launches triggered by gestures or voice
+commands go through one bounded queue served by a small worker pool. Repeats
+of an action that is still pending are dropped, each action key can be rate
+limited, and queue depth and action latency are tracked for /pipeline_stats.
+"""
+
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class ActionDispatcher:
+    """Bounded queue + worker threads for fire-and-forget actions
+
+    `submit(key, fn, *args)` returns a Future, or None when the action was
+    rejected: the queue is full, an action with the same key is still queued
+    or running, or the key fired less than `min_interval` seconds ago.
+    """
+
+    def __init__(self, workers=2, max_queue=32, window=200):
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.pending = set()
+        self.last_accepted = {}
+        self.threads = []
+        self.latencies = deque(maxlen=window)
+        self.counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'deduped': 0, 'rate_limited': 0, 'dropped': 0}
+        self.max_depth = 0
+        self.lock = threading.Lock()
+
+    def submit(self, key, fn, *args, min_interval=0):
+        now = time.monotonic()
+        with self.lock:
+            if key in self.pending:
+                self.counts['deduped'] += 1
+                return None
+            if min_interval and now - self.last_accepted.get(key, float('-inf')) < min_interval:
+                self.counts['rate_limited'] += 1
+                return None
+            future = Future()
+            try:
+                self.queue.put_nowait((key, fn, args, future, now))
+            except queue.Full:
+                self.counts['dropped'] += 1
+                return None
+            self.pending.add(key)
+            self.last_accepted[key] = now
+            self.counts['submitted'] += 1
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+            if len(self.threads) < self.workers:
+                self._start_worker()
+        return future
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work, name=f"action-worker-{len(self.threads) + 1}")
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            key, fn, args, future, queued_at = self.queue.get()
+            if not future.set_running_or_notify_cancel():
+                self._finish(key, queued_at, 'failed')
+                continue
+            try:
+                future.set_result(fn(*args))
+                self._finish(key, queued_at, 'completed')
+            except Exception as e:
+                print(f"Action {key} failed: {e}", file=sys.stderr)
+                future.set_exception(e)
+                self._finish(key, queued_at, 'failed')
+
+    def _finish(self, key, queued_at, outcome):
+        with self.lock:
+            self.pending.discard(key)
+            self.counts[outcome] += 1
+            # Latency from submit to completion, including time in the queue
+            self.latencies.append(time.monotonic() - queued_at)
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = dict(self.counts)
+            stats['queue_depth'] = self.queue.qsize()
+            stats['max_queue_depth'] = self.max_depth
+            stats['pending'] = sorted(self.pending)
+        if latencies:
+            stats['latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return stats
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_action_dispatcher():
+    """Process-wide dispatcher shared by every tool"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = ActionDispatcher()
+        return _dispatcher
@@ -0,0 +1,219 @@
+"""
+Audio Mixer - preloaded, in-process sound effects
+Sounds are decoded once into PCM buffers and mixed into a single output
+stream, so overlapping shots share one audio device instead of each starting
+a thread that re-reads the MP3. A null sink consumes the stream on a clock for
+machines without audio, and the delay from trigger to first mixed sample is
+tracked for /pipeline_stats.
+
+MP3 decoding uses the optional `miniaudio` package; WAV files are read with
+the standard library. Output goes through PyAudio when it is installed.
+"""
+
+import os
+import sys
+import threading
+import time
+import wave
+from collections import deque
+
+from tools.lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+
+def load_sound(path, sample_rate=48000, channels=2):
+    """Decode `path` to an int16 (frames, channels) array at `sample_rate`"""
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as f:
+            if f.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit WAV is supported")
+            source_rate, source_channels = f.getframerate(), f.getnchannels()
+            pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).reshape(-1, source_channels)
+    else:
+        try:
+            import miniaudio
+        except ImportError:
+            raise RuntimeError("decoding compressed audio needs the miniaudio package")
+        decoded = miniaudio.decode_file(path, miniaudio.SampleFormat.SIGNED16, channels, sample_rate)
+        source_rate, source_channels = sample_rate, channels
+        pcm = np.frombuffer(decoded.samples, dtype=np.int16).reshape(-1, channels)
+
+    if source_channels != channels:
+        mono = pcm.mean(axis=1, keepdims=True)
+        pcm = np.repeat(mono, channels, axis=1).astype(np.int16)
+    if source_rate != sample_rate and len(pcm):
+        # Linear resampling is plenty for short effects
+        positions = np.arange(int(len(pcm) * sample_rate / source_rate)) * source_rate / sample_rate
+        pcm = np.stack([np.interp(positions, np.arange(len(pcm)), pcm[:, c]) for c in range(channels)], axis=1)
+        pcm = pcm.astype(np.int16)
+    return np.ascontiguousarray(pcm)
+
+
+class NullSink:
+    """Pulls blocks from the mixer at the real-time rate and discards them"""
+
+    name = 'null'
+    output_latency = 0.0
+
+    def __init__(self, mixer):
+        self.mixer = mixer
+        self.running = False
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self._run, name="audio-null-sink")
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        interval = self.mixer.block_frames / self.mixer.sample_rate
+        next_block = time.monotonic()
+        while self.running:
+            self.mixer.render(self.mixer.block_frames)
+            next_block += interval
+            time.sleep(max(next_block - time.monotonic(), 0))
+
+    def stop(self):
+        self.running = False
+
+
+class PyAudioSink:
+    """Callback-driven PyAudio output stream fed by the mixer"""
+
+    name = 'pyaudio'
+
+    def __init__(self, mixer):
+        import pyaudio
+        self.mixer = mixer
+        self.audio = pyaudio.PyAudio()
+        self.continue_flag = pyaudio.paContinue
+        self.stream = self.audio.open(format=pyaudio.paInt16, channels=mixer.channels, rate=mixer.sample_rate,
+                                      output=True, frames_per_buffer=mixer.block_frames,
+                                      stream_callback=self._callback, start=False)
+        self.output_latency = self.stream.get_output_latency()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        return self.mixer.render(frame_count).tobytes(), self.continue_flag
+
+    def start(self):
+        self.stream.start_stream()
+
+    def stop(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+
+class AudioMixer:
+    """Mixes up to `max_voices` overlapping sounds into one output stream
+
+    `sink` is 'pyaudio', 'null' or 'auto' (PyAudio when a device can be
+    opened, otherwise null). The sink starts on the first play().
+    """
+
+    def __init__(self, sample_rate=48000, channels=2, block_frames=512, max_voices=4, sink='auto', window=100):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.max_voices = max_voices
+        self.sink_name = sink
+        self.sink = None
+        self.sounds = {}
+        self.started = {}
+        self.voices = []
+        self.played = 0
+        self.stolen = 0
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def load(self, name, path):
+        """Decode `path` once and keep it under `name`"""
+        self.sounds[name] = load_sound(path, self.sample_rate, self.channels)
+        return self.sounds[name]
+
+    def play(self, name, triggered_at=None, min_interval=0):
+        """Start a voice of sound `name`; `triggered_at` is a time.monotonic() stamp
+
+        Returns False if `name` started less than `min_interval` seconds ago.
+        When all voices are busy the oldest one is cut off.
+        """
+        now = time.monotonic()
+        voice = {'pcm': self.sounds[name], 'pos': 0, 'triggered_at': triggered_at or now}
+        with self.lock:
+            if now - self.started.get(name, float('-inf')) < min_interval:
+                return False
+            self.started[name] = now
+            if self.sink is None:
+                self._open_sink()
+            if len(self.voices) >= self.max_voices:
+                self.voices.pop(0)
+                self.stolen += 1
+            self.voices.append(voice)
+            self.played += 1
+        return True
+
+    def _open_sink(self):
+        if self.sink_name in ('auto', 'pyaudio'):
+            try:
+                self.sink = PyAudioSink(self)
+            except Exception as e:
+                if self.sink_name == 'pyaudio':
+                    raise
+                print(f"No audio output ({e}); using the null sink", file=sys.stderr)
+        if self.sink is None:
+            self.sink = NullSink(self)
+        self.sink.start()
+
+    def render(self, frames):
+        """Mix the next `frames` frames of every active voice into int16 PCM"""
+        out = np.zeros((frames, self.channels), dtype=np.int32)
+        now = time.monotonic()
+        with self.lock:
+            output_latency = self.sink.output_latency if self.sink else 0.0
+            for voice in self.voices:
+                pcm, pos = voice['pcm'], voice['pos']
+                if pos == 0:
+                    self.latencies.append(now - voice['triggered_at'] + output_latency)
+                chunk = pcm[pos:pos + frames]
+                out[:len(chunk)] += chunk
+                voice['pos'] = pos + len(chunk)
+            self.voices = [voice for voice in self.voices if voice['pos'] < len(voice['pcm'])]
+        return np.clip(out, -32768, 32767).astype(np.int16)
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                'sink': self.sink.name if self.sink else None,
+                'voices': len(self.voices),
+                'played': self.played,
+                'stolen': self.stolen,
+            }
+        if latencies:
+            stats['latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return stats
+
+    def close(self):
+        # render() takes the lock from the audio callback, and stopping the
+        # sink waits for that callback, so stop it after letting go
+        with self.lock:
+            sink, self.sink = self.sink, None
+        if sink is not None:
+            sink.stop()
+
+
+_mixer = None
+_mixer_lock = threading.Lock()
+
+
+def get_audio_mixer():
+    """Process-wide mixer; AUDIO_SINK picks 'auto', 'pyaudio' or 'null'"""
+    global _mixer
+    with _mixer_lock:
+        if _mixer is None:
+            _mixer = AudioMixer(sink=os.environ.get('AUDIO_SINK', 'auto'))
+        return _mixer
@@ -0,0 +1,434 @@
+"""
+Camera Service - shared frame capture for the vision tools
+One capture thread owns the camera and publishes the newest frames into a small
+ring buffer. Any number of consumers read from it without copying, and the
+device is released when the last consumer detaches.
+
+Failed reads back off exponentially and a camera that keeps failing is closed
+and reopened, so an unplugged or busy device never spins a core.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+from tools.lazy_imports import lazy_import
+from tools.stage_tracer import get_tracer
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# A published frame. `image` is shared between all consumers and is marked
+# read-only, so call cv2.flip / img.copy() before drawing on it.
+FramePacket = namedtuple('FramePacket', ['seq', 'timestamp', 'image'])
+
+DEFAULT_WIDTH = 1280
+DEFAULT_HEIGHT = 720
+
+# Capture states reported by CameraService.status()
+STOPPED = 'stopped'
+STARTING = 'starting'
+OK = 'ok'
+STALLED = 'stalled'
+RECONNECTING = 'reconnecting'
+FAILED = 'failed'
+
+
+class RateMeter:
+    """Events per second over a short rolling window"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.times = deque()
+        self.lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self.lock:
+            self.times.append(now)
+            while self.times and now - self.times[0] > self.window:
+                self.times.popleft()
+
+    def rate(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.times and now - self.times[0] > self.window:
+                self.times.popleft()
+            if len(self.times) < 2:
+                return 0.0
+            return (len(self.times) - 1) / max(self.times[-1] - self.times[0], 1e-6)
+
+
+class ReconnectPolicy:
+    """Backoff for failed reads and camera reconnects
+
+    After `read_failures` failed reads in a row the source is closed and
+    reopened. Reopen attempts back off from `base_delay` up to `max_delay`;
+    with `max_retries` set the capture gives up after that many attempts.
+    """
+
+    def __init__(self, read_failures=5, base_delay=0.05, max_delay=5.0, max_retries=None):
+        self.read_failures = read_failures
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+
+    def delay(self, attempt):
+        return min(self.base_delay * 2 ** max(attempt - 1, 0), self.max_delay)
+
+
+class DeviceSource:
+    """Frames from a local camera (cv2.VideoCapture device index)"""
+
+    def __init__(self, index=0, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.index)
+        self.cap.set(3, self.width)
+        self.cap.set(4, self.height)
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __repr__(self):
+        return f"DeviceSource({self.index})"
+
+
+class VideoFileSource:
+    """Frames from a video file, paced to the file's fps and looped by default"""
+
+    def __init__(self, path, loop=True, realtime=True):
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self.cap = None
+        self.frame_interval = 0
+        self.next_frame_time = 0
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.frame_interval = 1.0 / fps
+        self.next_frame_time = time.monotonic()
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.realtime:
+            delay = self.next_frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_frame_time = max(self.next_frame_time + self.frame_interval, time.monotonic())
+        success, img = self.cap.read()
+        if not success and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, img = self.cap.read()
+        return success, img
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __repr__(self):
+        return f"VideoFileSource({self.path!r})"
+
+
+class SyntheticSource:
+    """Generated frames for machines without a camera
+
+    `generator(index, width, height)` may return any BGR image; by default a
+    moving block and a frame counter are drawn so consecutive frames differ.
+    """
+
+    def __init__(self, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, fps=30, generator=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.generator = generator or self._default_frame
+        self.index = 0
+        self.next_frame_time = 0
+
+    def open(self):
+        self.index = 0
+        self.next_frame_time = time.monotonic()
+        return True
+
+    def read(self):
+        if self.fps:
+            delay = self.next_frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_frame_time = max(self.next_frame_time + 1.0 / self.fps, time.monotonic())
+        img = self.generator(self.index, self.width, self.height)
+        self.index += 1
+        return True, img
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _default_frame(index, width, height):
+        img = np.zeros((height, width, 3), dtype=np.uint8)
+        size = max(height // 6, 1)
+        x = (index * 8) % max(width - size, 1)
+        y = (height - size) // 2
+        img[y:y + size, x:x + size] = (0, 180, 255)
+        cv2.putText(img, f"Synthetic frame {index}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        return img
+
+    def __repr__(self):
+        return f"SyntheticSource({self.width}x{self.height}@{self.fps})"
+
+
+def make_source(spec=None):
+    """Build a frame source from a spec
+
+    Accepts an existing source object, a device index (int or digit string),
+    "synthetic" / "synthetic:640x480", "replay:<dir>" / "replay-fast:<dir>"
+    for a recording (see tools/recording.py), "shm:<name>" for frames another
+    process captures (see tools/frame_ring.py), or a path to a video file. When
+    no spec is given the CAMERA_SOURCE environment variable is used, falling
+    back to 0.
+    """
+    if spec is None:
+        spec = os.environ.get('CAMERA_SOURCE', '0')
+    if hasattr(spec, 'read') and hasattr(spec, 'open'):
+        return spec
+    if isinstance(spec, int):
+        return DeviceSource(spec)
+    spec = str(spec).strip()
+    if spec.isdigit():
+        return DeviceSource(int(spec))
+    if spec.startswith('synthetic'):
+        _, _, size = spec.partition(':')
+        if size:
+            width, height = (int(v) for v in size.lower().split('x'))
+            return SyntheticSource(width, height)
+        return SyntheticSource()
+    if spec.startswith(('replay:', 'replay-fast:')):
+        from tools.recording import ReplaySource
+        mode, _, path = spec.partition(':')
+        return ReplaySource(path, realtime=mode == 'replay')
+    if spec.startswith('shm:'):
+        from tools.frame_ring import FrameRingSource
+        return FrameRingSource(spec[len('shm:'):])
+    return VideoFileSource(spec)
+
+
+class CameraService:
+    """Single-owner capture thread publishing frames to a ring buffer"""
+
+    def __init__(self, source=None, ring_size=4, policy=None):
+        self.source = make_source(source)
+        self.policy = policy or ReconnectPolicy()
+        self.ring_size = ring_size
+        self.ring = [None] * ring_size
+        self.seq = 0
+        self.refcount = 0
+        self.running = False
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.state = STOPPED
+        self.last_frame_time = None
+        self.failed_reads = 0
+        self.reconnects = 0
+        self.lock = threading.Lock()
+        self.frame_ready = threading.Condition()
+        self.capture_rate = RateMeter()
+        self.tracer = get_tracer('camera')
+
+    @property
+    def replay(self):
+        """Whether the source plays back recorded frames rather than capturing new ones"""
+        return getattr(self.source, 'replay', False)
+
+    def acquire(self):
+        """Attach a consumer, starting the capture thread for the first one"""
+        with self.lock:
+            self.refcount += 1
+            # Also restart a capture that gave up while consumers were attached
+            if self.refcount == 1 or not self.running:
+                self._start()
+        return self
+
+    def release(self):
+        """Detach a consumer, releasing the camera after the last one"""
+        with self.lock:
+            if self.refcount == 0:
+                return
+            self.refcount -= 1
+            if self.refcount == 0:
+                self._stop()
+
+    def _start(self):
+        if self.thread is not None:
+            self.thread.join()
+        self.running = True
+        self.stop_event = threading.Event()
+        self.state = STARTING
+        self.thread = threading.Thread(target=self._capture_loop, args=(self.stop_event,), name=f"camera-{self.source!r}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _stop(self):
+        self.running = False
+        self.stop_event.set()
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+
+    def _capture_loop(self, stop_event):
+        print(f"Camera capture started on {self.source!r}", file=sys.stderr)
+        policy = self.policy
+        opened = False
+        attempt = 0
+        failures = 0
+        try:
+            while not stop_event.is_set():
+                if not opened:
+                    opened = self.source.open()
+                    if not opened:
+                        self.source.close()
+                        attempt += 1
+                        if policy.max_retries is not None and attempt >= policy.max_retries:
+                            print(f"Error: could not open {self.source!r} after {attempt} attempts. Camera may be in use by another process.", file=sys.stderr)
+                            self.state = FAILED
+                            break
+                        delay = policy.delay(attempt)
+                        print(f"Camera not available (attempt {attempt}), retrying in {delay:.2f}s...", file=sys.stderr)
+                        self.state = RECONNECTING
+                        stop_event.wait(delay)
+                        continue
+
+                trace = self.tracer.begin()
+                success, img = self.source.read()
+                if success:
+                    # Includes waiting for the device to deliver the frame
+                    trace.mark('read')
+                    failures = 0
+                    attempt = 0
+                    self.state = OK
+                    self._publish(img)
+                    continue
+
+                failures += 1
+                self.failed_reads += 1
+                if failures >= policy.read_failures:
+                    # The device stopped delivering: close it and reconnect
+                    print(f"{failures} failed reads from {self.source!r}, reconnecting...", file=sys.stderr)
+                    self.source.close()
+                    opened = False
+                    failures = 0
+                    self.reconnects += 1
+                    self.state = RECONNECTING
+                    continue
+                self.state = STALLED
+                stop_event.wait(policy.delay(failures))
+        except Exception as e:
+            print(f"Error in camera capture loop: {e}", file=sys.stderr)
+            self.state = FAILED
+        finally:
+            self.source.close()
+            if self.state == FAILED:
+                # Let consumers see the end of the stream instead of waiting
+                self._stop()
+            else:
+                self.state = STOPPED
+            print(f"Camera capture stopped on {self.source!r}", file=sys.stderr)
+
+    def _publish(self, img):
+        # Frames are never written after publishing, so readers can share them
+        img.flags.writeable = False
+        with self.frame_ready:
+            seq = self.seq + 1
+            self.ring[seq % self.ring_size] = FramePacket(seq, time.monotonic(), img)
+            self.seq = seq
+            self.last_frame_time = time.monotonic()
+            self.frame_ready.notify_all()
+        self.capture_rate.tick()
+
+    def fps(self):
+        return self.capture_rate.rate()
+
+    def status(self):
+        """Capture state and health counters for the status endpoint"""
+        since = None
+        if self.last_frame_time is not None:
+            since = round(time.monotonic() - self.last_frame_time, 3)
+        return {
+            'source': repr(self.source),
+            'state': self.state,
+            'consumers': self.refcount,
+            'seconds_since_last_frame': since,
+            'failed_reads': self.failed_reads,
+            'reconnects': self.reconnects,
+            'fps': round(self.fps(), 1),
+        }
+
+    def latest(self):
+        """Return the newest FramePacket, or None before the first frame"""
+        return self.ring[self.seq % self.ring_size] if self.seq else None
+
+    def get(self, seq):
+        """Return the FramePacket for `seq` if it is still in the ring"""
+        packet = self.ring[seq % self.ring_size]
+        if packet is not None and packet.seq == seq:
+            return packet
+        return None
+
+    def wait_for_frame(self, last_seq=0, timeout=1.0):
+        """Block until a frame newer than `last_seq` is published
+
+        Returns the newest FramePacket, or None on timeout or shutdown.
+        """
+        deadline = time.monotonic() + timeout
+        with self.frame_ready:
+            while self.seq <= last_seq and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.frame_ready.wait(remaining)
+            if self.seq <= last_seq:
+                return None
+            return self.ring[self.seq % self.ring_size]
+
+    def frames(self, timeout=1.0):
+        """Yield each newest frame in turn; newer frames replace unread ones"""
+        last_seq = 0
+        while self.running:
+            packet = self.wait_for_frame(last_seq, timeout)
+            if packet is None:
+                continue
+            last_seq = packet.seq
+            yield packet
+
+
+# Shared services keyed by source spec, so every tool in the process reads the
+# same camera instead of opening the device again.
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_camera(source=None):
+    """Return the shared CameraService for a source spec (see make_source)"""
+    key = source if source is not None else os.environ.get('CAMERA_SOURCE', '0')
+    if not isinstance(key, (int, str)):
+        key = id(key)
+    key = str(key)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = CameraService(source)
+            _services[key] = service
+        return service
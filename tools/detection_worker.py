@@ -0,0 +1,408 @@
+"""
+Detection Worker - hand landmark inference off the stream thread
+A small pool of threads runs HandDetector.findHands on the newest camera frame
+and publishes the landmarks. Video streams overlay the most recent result at
+capture rate instead of waiting for inference on every frame.
+
+With max_hands above 1 every hand gets a stable 'id' (tools/hand_tracker.py).
+The full frame is then only scanned every few frames to pick up new hands;
+in between, the tracked hands are re-detected together in one mosaic of the
+crops around them.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+from tools.camera_service import RateMeter, get_camera
+from tools.hand_poses import finger_flags, gun_pose, landmark_array
+from tools.hand_tracker import HandTracker, bbox_iou
+from tools.landmark_cache import get_landmark_cache
+from tools.motion_gate import MotionGate
+from tools.stage_tracer import get_tracer
+
+# Landmarks for one camera frame. `hands` uses the cvzone layout (lmList,
+# bbox, center, type) in the coordinates of the mirrored display frame.
+HandResult = namedtuple('HandResult', ['seq', 'timestamp', 'hands', 'latency'])
+
+HAND_CONNECTIONS = [
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+]
+
+
+def default_detector(max_hands=1):
+    from cvzone.HandTrackingModule import HandDetector
+    return HandDetector(detectionCon=0.8, maxHands=max_hands)
+
+
+def fingers_up(hand):
+    """Same rule as HandDetector.fingersUp, without needing the detector"""
+    return finger_flags(*landmark_array([hand]))[0].astype(int).tolist()
+
+
+def is_gun_pose(hand):
+    """Tool2's gun gesture: thumb and index extended, middle finger curled"""
+    return bool(gun_pose(landmark_array([hand])[0])[0])
+
+
+def scale_hands(hands, sx, sy):
+    """Map hands found on a resized frame back to full-frame pixels"""
+    scaled = []
+    for hand in hands:
+        hand = dict(hand)
+        # cvzone scales z by the frame width, so it follows x
+        hand['lmList'] = [[int(lm[0] * sx), int(lm[1] * sy), int(lm[2] * sx)] for lm in hand['lmList']]
+        x, y, w, h = hand['bbox']
+        hand['bbox'] = (int(x * sx), int(y * sy), int(w * sx), int(h * sy))
+        if 'center' in hand:
+            hand['center'] = (int(hand['center'][0] * sx), int(hand['center'][1] * sy))
+        scaled.append(hand)
+    return scaled
+
+
+def translate_hands(hands, dx, dy):
+    """Move hands found on a crop to the coordinates of the full frame"""
+    moved = []
+    for hand in hands:
+        hand = dict(hand)
+        hand['lmList'] = [[lm[0] + dx, lm[1] + dy, lm[2]] for lm in hand['lmList']]
+        x, y, w, h = hand['bbox']
+        hand['bbox'] = (x + dx, y + dy, w, h)
+        if 'center' in hand:
+            hand['center'] = (hand['center'][0] + dx, hand['center'][1] + dy)
+        moved.append(hand)
+    return moved
+
+
+def detect_hands(detector, img, inference_width=0, flip=True):
+    """Run findHands, optionally on a copy downscaled to `inference_width`
+
+    Landmarks are always returned in the coordinates of `img` (mirrored when
+    `flip` is set), so gesture rules behave the same at any inference size.
+    """
+    h, w = img.shape[:2]
+    small = img
+    if inference_width and w > inference_width:
+        small = cv2.resize(img, (inference_width, max(round(h * inference_width / w), 1)), interpolation=cv2.INTER_AREA)
+    if flip:
+        small = cv2.flip(small, 1)
+    found = detector.findHands(small, draw=False)
+    # findHands returns (hands, img) when drawing and just hands otherwise
+    hands = found[0] if isinstance(found, tuple) else found
+    if small.shape[1] != w:
+        hands = scale_hands(hands, w / small.shape[1], h / small.shape[0])
+    return hands
+
+
+def detect_in_rois(detector, img, rois, cell=256, flip=True):
+    """Find one hand in each (x0, y0, x1, y1) region of the display frame
+
+    The regions are scaled to `cell` pixels and tiled into one mosaic, so a
+    single findHands call covers every tracked hand. Returns (index, hand)
+    pairs with landmarks in display coordinates, i.e. mirrored when `flip`
+    is set, like the rest of the pipeline.
+    """
+    cols = math.ceil(math.sqrt(len(rois)))
+    rows = math.ceil(len(rois) / cols)
+    mosaic = np.zeros((rows * cell, cols * cell, 3), dtype=np.uint8)
+    w = img.shape[1]
+    scales = []
+    for i, (x0, y0, x1, y1) in enumerate(rois):
+        crop = img[y0:y1, w - x1:w - x0] if flip else img[y0:y1, x0:x1]
+        scale = cell / max(x1 - x0, y1 - y0)
+        crop = cv2.resize(crop, (max(round((x1 - x0) * scale), 1), max(round((y1 - y0) * scale), 1)),
+                          interpolation=cv2.INTER_AREA)
+        if flip:
+            crop = cv2.flip(crop, 1)
+        top, left = i // cols * cell, i % cols * cell
+        mosaic[top:top + crop.shape[0], left:left + crop.shape[1]] = crop
+        scales.append(scale)
+
+    found = {}
+    for hand in detect_hands(detector, mosaic, 0, flip=False):
+        x, y, bw, bh = hand['bbox']
+        row, col = int((y + bh / 2) // cell), int((x + bw / 2) // cell)
+        i = row * cols + col
+        if not (0 <= row < rows and 0 <= col < cols) or i >= len(rois) or i in found:
+            continue
+        # Back from the cell to the region it was cut from
+        x0, y0 = rois[i][:2]
+        hand = scale_hands(translate_hands([hand], -col * cell, -row * cell), 1 / scales[i], 1 / scales[i])[0]
+        found[i] = translate_hands([hand], x0, y0)[0]
+    return sorted(found.items())
+
+
+def cached_detect_hands(detector, img, inference_width=0, flip=True, frame_id=None, match_content=False):
+    """detect_hands through the shared landmark cache (when enabled)
+
+    Pass `frame_id` as (camera, seq) for camera frames so other consumers of
+    the same frame find the result without fingerprinting it, and
+    `match_content` when the camera replays a recording.
+    """
+    cache = get_landmark_cache()
+    if cache is None:
+        return detect_hands(detector, img, inference_width, flip)
+    params = (type(detector).__name__, getattr(detector, 'maxHands', None), getattr(detector, 'detectionCon', None),
+              inference_width, flip)
+    return cache.get_or_compute(img, lambda: detect_hands(detector, img, inference_width, flip), params, frame_id,
+                                match_content)
+
+
+def draw_hands(img, hands):
+    """Draw landmarks and bounding boxes the way findHands(draw=True) does"""
+    for hand in hands:
+        points = [(int(lm[0]), int(lm[1])) for lm in hand['lmList']]
+        for a, b in HAND_CONNECTIONS:
+            cv2.line(img, points[a], points[b], (224, 224, 224), 2)
+        for point in points:
+            cv2.circle(img, point, 4, (0, 0, 255), cv2.FILLED)
+        x, y, w, h = hand['bbox']
+        cv2.rectangle(img, (x - 20, y - 20), (x + w + 20, y + h + 20), (255, 0, 255), 2)
+        label = f"{hand['type']} #{hand['id']}" if 'id' in hand else hand['type']
+        cv2.putText(img, label, (x - 30, y - 30), cv2.FONT_HERSHEY_PLAIN, 2, (255, 0, 255), 2)
+    return img
+
+
+class DetectionWorker:
+    """Thread pool publishing hand landmarks for the newest camera frame
+
+    Each worker thread owns its own detector (built by `make_detector`) and
+    claims the newest frame nobody has started on yet, so inference never
+    queues up behind the camera. With a `motion_gate`, frames of a static
+    scene with no hand in view are skipped.
+
+    With `max_hands` above 1, hands are tracked across frames. Every
+    `detect_every` frames, or when a tracked hand is lost, the full frame is
+    searched; otherwise each tracked hand is looked for in a square `roi_scale`
+    times its size, scaled to `roi_width`, and all of these squares go through
+    one detector call as a mosaic (detector built by `make_roi_detector`).
+    """
+
+    def __init__(self, camera_source=None, workers=1, make_detector=None, flip=True, inference_width=0,
+                 motion_gate=None, max_hands=1, detect_every=10, roi_scale=1.8, roi_width=256, make_roi_detector=None):
+        self.camera_source = camera_source
+        self.workers = workers
+        self.inference_width = inference_width
+        self.motion_gate = motion_gate
+        self.max_hands = max_hands
+        self.make_detector = make_detector or (lambda: default_detector(max_hands))
+        self.make_roi_detector = make_roi_detector or self.make_detector
+        self.flip = flip
+        self.tracker = HandTracker() if max_hands > 1 else None
+        self.detect_every = detect_every
+        self.roi_scale = roi_scale
+        self.roi_width = roi_width
+        self.frames_since_full = 0
+        self.force_full = False
+        self.detections = {'full': 0, 'roi': 0}
+        self.refcount = 0
+        self.stop_event = None
+        self.threads = []
+        self.camera = None
+        self.claimed_seq = 0
+        self.result = None
+        self.lock = threading.Lock()
+        self.claim_lock = threading.Lock()
+        self.inference_rate = RateMeter()
+        self.tracer = get_tracer('detection')
+
+    def acquire(self):
+        """Attach a consumer, starting the pool for the first one"""
+        with self.lock:
+            self.refcount += 1
+            if self.refcount == 1:
+                self._start()
+        return self
+
+    def release(self):
+        """Detach a consumer, stopping the pool after the last one"""
+        with self.lock:
+            if self.refcount == 0:
+                return
+            self.refcount -= 1
+            if self.refcount == 0:
+                self._stop()
+
+    def latest(self):
+        """Return the newest HandResult, or None before the first one"""
+        return self.result
+
+    def stats(self):
+        result = self.result
+        cache = get_landmark_cache()
+        return {
+            'workers': self.workers,
+            'inference_width': self.inference_width or None,
+            'capture_fps': round(self.camera.fps(), 1) if self.camera else 0.0,
+            'inference_fps': round(self.inference_rate.rate(), 1),
+            'inference_ms': round(result.latency * 1000, 1) if result else None,
+            'motion_gate': self.motion_gate.stats() if self.motion_gate else None,
+            'tracking': {
+                'max_hands': self.max_hands,
+                'tracks': len(self.tracker),
+                'full_frame_detections': self.detections['full'],
+                'roi_detections': self.detections['roi'],
+            } if self.tracker else None,
+            'landmark_cache': cache.stats() if cache else None,
+        }
+
+    def _start(self):
+        # Each run gets its own stop event so threads from a previous run
+        # can never pick up work after a quick restart
+        self.stop_event = threading.Event()
+        self.camera = get_camera(self.camera_source).acquire()
+        self.result = None
+        if self.motion_gate:
+            self.motion_gate.reset()
+        if self.tracker:
+            self.tracker.reset()
+        self.threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(self.stop_event, self.camera), name=f"hand-detector-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _stop(self):
+        self.stop_event.set()
+        self.camera.release()
+
+    def _claim_frame(self, stop_event, camera):
+        """Return the newest unclaimed frame, waiting for one if needed"""
+        while not stop_event.is_set():
+            packet = camera.wait_for_frame(self.claimed_seq)
+            if packet is None:
+                if not camera.running:
+                    # The capture gave up; don't spin until it is restarted
+                    stop_event.wait(0.5)
+                continue
+            with self.claim_lock:
+                if packet.seq > self.claimed_seq:
+                    self.claimed_seq = packet.seq
+                    return packet
+        return None
+
+    def _work(self, stop_event, camera):
+        try:
+            detector = self.make_detector()
+        except Exception as e:
+            print(f"Error creating hand detector: {e}", file=sys.stderr)
+            return
+        # Mosaic detector and the track ids it was last used for
+        roi_state = {'detector': None, 'layout': None}
+        while not stop_event.is_set():
+            packet = self._claim_frame(stop_event, camera)
+            if packet is None:
+                break
+            if self._static_scene(packet):
+                continue
+            trace = self.tracer.begin(packet.timestamp)
+            # How old the frame was when a worker picked it up
+            trace.mark('frame_age')
+            start = time.monotonic()
+            rois = self._rois(packet)
+            try:
+                if rois is None:
+                    hands = cached_detect_hands(detector, packet.image, self.inference_width, self.flip,
+                                                (id(camera), packet.seq), camera.replay)
+                else:
+                    hands = self._detect_rois(roi_state, packet.image, rois)
+            except Exception as e:
+                print(f"Error in hand detection: {e}", file=sys.stderr)
+                continue
+            trace.mark('find_hands' if rois is None else 'find_hands_roi')
+            self._publish(HandResult(packet.seq, packet.timestamp, hands, time.monotonic() - start))
+
+    def _rois(self, packet):
+        """Tracked hands' ROIs for this frame, or None to search the whole frame"""
+        if self.tracker is None:
+            return None
+        h, w = packet.image.shape[:2]
+        with self.claim_lock:
+            rois = self.tracker.rois(w, h, packet.timestamp, self.roi_scale)
+            if not rois or self.force_full or self.frames_since_full >= self.detect_every:
+                self.frames_since_full = 0
+                self.force_full = False
+                self.detections['full'] += 1
+                return None
+            self.frames_since_full += 1
+            self.detections['roi'] += 1
+            return rois
+
+    def _detect_rois(self, roi_state, img, rois):
+        layout = tuple(track_id for track_id, _ in rois)
+        if roi_state['layout'] != layout:
+            # MediaPipe follows hands from one call to the next; when the
+            # mosaic cells change hands, start from a detector with no history
+            roi_state['detector'] = self.make_roi_detector()
+            roi_state['layout'] = layout
+        hands = []
+        for _, hand in detect_in_rois(roi_state['detector'], img, [roi for _, roi in rois], self.roi_width, self.flip):
+            # Neighbouring ROIs overlap and can both find the same hand
+            if all(bbox_iou(hand['bbox'], other['bbox']) < 0.5 for other in hands):
+                hands.append(hand)
+        if len(hands) < len(rois):
+            # A hand left its ROI: look over the whole frame next time
+            with self.claim_lock:
+                self.force_full = True
+        return hands
+
+    def _static_scene(self, packet):
+        # Keep detecting while a hand is visible so held gestures stay live
+        result = self.result
+        if self.motion_gate is None or (result is not None and result.hands):
+            return False
+        return not self.motion_gate.changed(packet.image, packet.timestamp)
+
+    def _publish(self, result):
+        with self.claim_lock:
+            # With several workers results can finish out of order
+            if self.result is None or result.seq > self.result.seq:
+                if self.tracker is not None:
+                    result = result._replace(hands=self.tracker.update(result.hands, result.timestamp))
+                self.result = result
+        self.inference_rate.tick()
+
+
+# Shared pools keyed like the camera services, so tools reading the same
+# camera also share its landmarks.
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_detection_worker(camera_source=None):
+    """Return the shared DetectionWorker for a camera source
+
+    The pool size comes from the DETECTION_WORKERS environment variable and
+    the detection resolution from INFERENCE_WIDTH (0 keeps full frames).
+    MAX_HANDS enables multi-hand tracking, with HAND_DETECT_EVERY frames
+    between full-frame searches and tracked hands re-detected at
+    HAND_ROI_WIDTH pixels.
+    """
+    key = str(camera_source if camera_source is not None else os.environ.get('CAMERA_SOURCE', '0'))
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None:
+            worker = DetectionWorker(
+                camera_source,
+                workers=int(os.environ.get('DETECTION_WORKERS', '1')),
+                inference_width=int(os.environ.get('INFERENCE_WIDTH', '480')),
+                motion_gate=MotionGate.from_env(),
+                max_hands=int(os.environ.get('MAX_HANDS', '1')),
+                detect_every=int(os.environ.get('HAND_DETECT_EVERY', '10')),
+                roi_width=int(os.environ.get('HAND_ROI_WIDTH', '256')),
+            )
+            _workers[key] = worker
+        return worker
@@ -0,0 +1,285 @@
+"""
+Frame Ring - camera frames in shared memory for other processes
+One capture process writes every frame into a fixed number of slots in a
+named shared-memory block; the Flask server, the tool scripts or separate
+inference processes map the same block and read frames from it, with no
+pickling and at most one copy. A header holds the newest sequence number and
+each slot records the sequence number and capture time of the frame in it.
+
+A frame stays valid until the writer comes round to its slot again, `slots`
+frames later. FrameRing.get() returns a view of the slot, and a reader that
+uses it in place checks FrameRing.valid(seq) afterwards, like a seqlock;
+FrameRingSource copies each frame out and drops copies the writer overran.
+Readers poll the header, backing off to half a frame interval, so there is
+no cross-process locking.
+
+Usage:
+    python -m tools.frame_ring serve --source 0 --name vision-camera
+    CAMERA_SOURCE=shm:vision-camera python app.py
+"""
+
+import argparse
+import os
+import signal
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from tools.camera_service import FramePacket
+from tools.lazy_imports import lazy_import
+from tools.state_store import process_alive
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+MAGIC = b'FRNG'
+VERSION = 1
+# magic, version, slots, width, height, channels, newest seq, writer pid
+HEADER = struct.Struct('<4sIIIIIQQ')
+SEQ_OFFSET = 24
+HEADER_SIZE = 64
+# seq (0 while being written), capture time (time.monotonic)
+SLOT = struct.Struct('<Qd')
+
+
+def _data_offset(slots):
+    return (HEADER_SIZE + SLOT.size * slots + 63) // 64 * 64
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.version_info < (3, 13) and sys.platform != 'win32':
+        # Before 3.13 every process that maps a block unlinks it on exit;
+        # only the writer should
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class FrameRing:
+    """Fixed-slot ring of equally sized frames in a named shared-memory block
+
+    Use FrameRing.create in the writer and FrameRing.attach in readers.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        magic, version, self.slots, self.width, self.height, self.channels, _, self.writer_pid = \
+            HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} is not a frame ring")
+        self.shape = (self.height, self.width, self.channels)
+        frame_bytes = self.height * self.width * self.channels
+        data = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm.buf,
+                          offset=_data_offset(self.slots))
+        if not owner:
+            data.flags.writeable = False
+        self.frames = [data[i] for i in range(self.slots)]
+        self.size = frame_bytes * self.slots
+
+    @classmethod
+    def create(cls, name, width, height, channels=3, slots=8):
+        """New ring, replacing one left behind by a writer that has exited"""
+        size = _data_offset(slots) + width * height * channels * slots
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = _attach(name)
+            pid = HEADER.unpack_from(stale.buf, 0)[7] if stale.size >= HEADER.size else 0
+            if pid and process_alive(pid):
+                stale.close()
+                raise RuntimeError(f"frame ring {name} is already written by process {pid}")
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, width, height, channels, 0, os.getpid())
+        for i in range(slots):
+            SLOT.pack_into(shm.buf, HEADER_SIZE + SLOT.size * i, 0, 0.0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Map an existing ring read-only; FileNotFoundError if nobody created it"""
+        return cls(_attach(name), owner=False)
+
+    @property
+    def seq(self):
+        """Sequence number of the newest frame (0 before the first one)"""
+        return struct.unpack_from('<Q', self.shm.buf, SEQ_OFFSET)[0]
+
+    def write(self, img, timestamp=None):
+        """Copy `img` into the next slot and publish it; returns its seq"""
+        seq = self.seq + 1
+        slot = seq % self.slots
+        offset = HEADER_SIZE + SLOT.size * slot
+        # Readers holding the old frame in this slot see it invalidated first
+        SLOT.pack_into(self.shm.buf, offset, 0, 0.0)
+        if img.shape != self.shape:
+            img = cv2.resize(img, (self.width, self.height))
+        self.frames[slot][...] = img
+        SLOT.pack_into(self.shm.buf, offset, seq, time.monotonic() if timestamp is None else timestamp)
+        struct.pack_into('<Q', self.shm.buf, SEQ_OFFSET, seq)
+        return seq
+
+    def get(self, seq):
+        """FramePacket viewing frame `seq`, or None once it has been overwritten"""
+        slot_seq, timestamp = SLOT.unpack_from(self.shm.buf, HEADER_SIZE + SLOT.size * (seq % self.slots))
+        if slot_seq != seq:
+            return None
+        return FramePacket(seq, timestamp, self.frames[seq % self.slots])
+
+    def valid(self, seq):
+        """Whether frame `seq` is still in its slot (check after using a view)"""
+        return SLOT.unpack_from(self.shm.buf, HEADER_SIZE + SLOT.size * (seq % self.slots))[0] == seq
+
+    def latest(self):
+        seq = self.seq
+        return self.get(seq) if seq else None
+
+    def frame_interval(self):
+        """Seconds between the two newest frames, or None until there are two"""
+        seq = self.seq
+        if seq < 2:
+            return None
+        newest = SLOT.unpack_from(self.shm.buf, HEADER_SIZE + SLOT.size * (seq % self.slots))
+        previous = SLOT.unpack_from(self.shm.buf, HEADER_SIZE + SLOT.size * ((seq - 1) % self.slots))
+        if newest[0] != seq or previous[0] != seq - 1 or newest[1] <= previous[1]:
+            return None
+        return newest[1] - previous[1]
+
+    def wait_for_frame(self, last_seq=0, timeout=1.0, poll=0.001):
+        """Newest FramePacket after `last_seq`, or None after `timeout` seconds
+
+        Polling starts every `poll` seconds and backs off to half the frame
+        interval, so a waiting reader wakes a few times per frame at most.
+        """
+        deadline = time.monotonic() + timeout
+        delay = poll
+        while True:
+            seq = self.seq
+            if seq > last_seq:
+                packet = self.get(seq)
+                if packet is not None:
+                    return packet
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max((self.frame_interval() or 1 / 30) / 2, poll))
+
+    def writer_alive(self):
+        return process_alive(self.writer_pid)
+
+    def close(self):
+        # Views into the block must go before it can be unmapped
+        self.frames = []
+        try:
+            self.shm.close()
+        except BufferError:
+            # A consumer still holds a frame; the mapping goes with it
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class FrameRingSource:
+    """Camera source reading a FrameRing written by another process (CAMERA_SOURCE=shm:<name>)
+
+    CameraService consumers keep frames for as long as they like, so each
+    frame is copied out of shared memory; a copy the writer overwrote while it
+    was being taken is dropped for a newer frame. A writer that stops or
+    exits counts as failed reads, so CameraService reattaches once the
+    capture process is back.
+    """
+
+    def __init__(self, name, timeout=1.0):
+        self.name = name
+        self.timeout = timeout
+        self.ring = None
+        self.last_seq = 0
+
+    def open(self):
+        try:
+            self.ring = FrameRing.attach(self.name)
+        except (FileNotFoundError, ValueError):
+            return False
+        self.last_seq = self.ring.seq
+        return True
+
+    def read(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            packet = self.ring.wait_for_frame(self.last_seq, max(deadline - time.monotonic(), 0))
+            if packet is None:
+                return False, None
+            img = packet.image.copy()
+            if self.ring.valid(packet.seq):
+                self.last_seq = packet.seq
+                return True, img
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def __repr__(self):
+        return f"FrameRingSource({self.name!r})"
+
+
+def serve(name, source=None, slots=8):
+    """Capture `source` into the ring `name` until interrupted"""
+    from tools.camera_service import get_camera
+
+    camera = get_camera(source).acquire()
+    ring = None
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        for packet in camera.frames():
+            if stopping:
+                break
+            if ring is None:
+                height, width = packet.image.shape[:2]
+                ring = FrameRing.create(name, width, height, packet.image.shape[2], slots)
+                print(f"Serving {width}x{height} frames from {camera.source!r} as shared memory '{name}' "
+                      f"({slots} slots, {ring.size / 1e6:.1f} MB)", file=sys.stderr)
+            ring.write(packet.image, packet.timestamp)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.release()
+        if ring is not None:
+            ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="capture a camera into a shared-memory ring")
+    serve_parser.add_argument('--name', default='vision-camera')
+    serve_parser.add_argument('--source', default=None, help="camera source spec (default: CAMERA_SOURCE or 0)")
+    serve_parser.add_argument('--slots', type=int, default=8)
+    info = commands.add_parser('info', help="describe a running ring")
+    info.add_argument('--name', default='vision-camera')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        try:
+            serve(args.name, args.source, args.slots)
+        except RuntimeError as e:
+            sys.exit(str(e))
+    else:
+        try:
+            ring = FrameRing.attach(args.name)
+        except FileNotFoundError:
+            sys.exit(f"no frame ring named {args.name}")
+        latest = ring.latest()
+        age = f"{time.monotonic() - latest.timestamp:.3f}s ago" if latest else "none yet"
+        print(f"{ring.width}x{ring.height}x{ring.channels}, {ring.slots} slots, newest frame {ring.seq} ({age}), "
+              f"writer {ring.writer_pid} {'running' if ring.writer_alive() else 'gone'}")
+        ring.close()
+
+
+if __name__ == '__main__':
+    main()
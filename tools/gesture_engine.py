@@ -0,0 +1,144 @@
+"""
+Gesture Engine - smoothed, debounced finger patterns for tool1
+Landmarks from consecutive detections are kept in a short ring buffer and
+run through a One-Euro filter, and a finger pattern only fires once it has
+been the same for K detections in a row. Holding a pattern fires it once; it
+re-arms when a different pattern settles or the hand leaves the frame.
+"""
+
+import math
+import os
+import threading
+
+from tools.lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+from tools.hand_poses import finger_flags
+
+
+class OneEuroFilter:
+    """One-Euro low-pass filter applied element-wise to a NumPy array
+
+    Slow movements are smoothed with a cutoff near `min_cutoff` Hz; the cutoff
+    rises with speed (scaled by `beta`) so fast movements don't lag.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value = None
+        self.speed = None
+        self.timestamp = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def reset(self):
+        self.value = None
+        self.speed = None
+        self.timestamp = None
+
+    def __call__(self, x, timestamp):
+        x = np.array(x, dtype=np.float32)
+        if self.value is None or timestamp <= self.timestamp:
+            self.value = x
+            self.speed = np.zeros_like(x)
+            self.timestamp = timestamp
+            return self.value
+        dt = timestamp - self.timestamp
+        self.timestamp = timestamp
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.speed = self.speed + a_d * ((x - self.value) / dt - self.speed)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        self.value = self.value + self._alpha(cutoff, dt) * (x - self.value)
+        return self.value
+
+
+class GestureEngine:
+    """Turns a stream of detections into debounced finger-pattern events
+
+    Call `update(hand, timestamp)` once per new detection (`hand` in the
+    cvzone layout, or None when no hand is visible). It returns the pattern as
+    a list of five 0/1 flags on the detection where the pattern has been
+    stable for `stable_frames` detections, and None otherwise.
+    """
+
+    def __init__(self, stable_frames=4, history=16, min_cutoff=1.0, beta=0.05, max_gap=0.5):
+        self.stable_frames = stable_frames
+        self.history = max(history, stable_frames)
+        self.max_gap = max_gap
+        self.filter = OneEuroFilter(min_cutoff, beta)
+        self.landmarks = np.zeros((self.history, 21, 3), dtype=np.float32)
+        self.patterns = np.zeros((self.history, 5), dtype=np.uint8)
+        self.count = 0
+        self.last_timestamp = None
+        self.hand_type = None
+        self.fired = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Read GESTURE_STABLE_FRAMES, GESTURE_MIN_CUTOFF and GESTURE_BETA"""
+        return cls(
+            stable_frames=int(os.environ.get('GESTURE_STABLE_FRAMES', '4')),
+            min_cutoff=float(os.environ.get('GESTURE_MIN_CUTOFF', '1.0')),
+            beta=float(os.environ.get('GESTURE_BETA', '0.05')),
+        )
+
+    def reset(self):
+        """Forget the buffered frames and re-arm"""
+        with self.lock:
+            self._reset()
+
+    def _reset(self):
+        self.filter.reset()
+        self.count = 0
+        self.last_timestamp = None
+        self.hand_type = None
+        self.fired = None
+
+    def update(self, hand, timestamp):
+        with self.lock:
+            if hand is None:
+                self._reset()
+                return None
+            # A long gap or a different hand starts a new track
+            if self.last_timestamp is not None and (timestamp - self.last_timestamp > self.max_gap
+                                                    or hand['type'] != self.hand_type):
+                self._reset()
+            self.last_timestamp = timestamp
+            self.hand_type = hand['type']
+
+            slot = self.count % self.history
+            self.landmarks[slot] = hand['lmList']
+            smoothed = self.filter(self.landmarks[slot], timestamp)
+            self.patterns[slot] = finger_flags(smoothed[None], [hand['type'] == "Right"])[0]
+            self.count += 1
+
+            if self.count < self.stable_frames:
+                return None
+            # Last K patterns in the ring, oldest first
+            recent = self.patterns[(np.arange(self.count - self.stable_frames, self.count)) % self.history]
+            if not np.all(recent == recent[-1]):
+                return None
+            pattern = recent[-1].tolist()
+            if pattern == self.fired:
+                return None
+            self.fired = pattern
+            return pattern
+
+    def current(self):
+        """Smoothed pattern of the latest detection, or None without a hand"""
+        with self.lock:
+            if not self.count:
+                return None
+            return self.patterns[(self.count - 1) % self.history].tolist()
+
+    def smoothed_landmarks(self):
+        """Filtered (21, 3) landmarks of the latest detection, or None"""
+        with self.lock:
+            return None if self.filter.value is None else self.filter.value.copy()
@@ -0,0 +1,151 @@
+"""
+Gesture Registry - one routing table from finger patterns to actions
+Finger patterns are packed into a 5-bit mask (thumb = bit 0) that indexes a
+32-slot table, so a lookup is a single list access. The table is loaded from
+gestures.json and reloaded when the file changes, and actions go through the
+shared action dispatcher so a slow browser launch never stalls the video stream.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import webbrowser
+from collections import namedtuple
+
+from tools.action_dispatcher import get_action_dispatcher
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gestures.json')
+
+# One routing entry; `fingers` is the 0/1 list it was declared with
+Gesture = namedtuple('Gesture', ['fingers', 'label', 'name', 'action', 'target'])
+
+
+def pack_fingers(fingers):
+    """5-bit mask of a fingers-up list, thumb in bit 0"""
+    mask = 0
+    for i, up in enumerate(fingers):
+        if up:
+            mask |= 1 << i
+    return mask
+
+
+def open_url(target):
+    """Open `target` in the default browser; True on success"""
+    try:
+        webbrowser.open(target)
+        return True
+    except Exception as e:
+        print(f"Error opening browser: {e}", file=sys.stderr)
+        return False
+
+
+# Action types usable in the config file
+ACTIONS = {
+    'open_url': open_url,
+}
+
+
+class GestureRegistry:
+    """Finger-pattern routing table backed by a JSON config file
+
+    The file is checked for changes at most every `reload_interval` seconds
+    during lookups. A config that fails to parse is reported and the previous
+    table stays in use. Debouncing is the gesture engine's job, so there is no
+    cooldown between actions unless `min_interval` is set.
+    """
+
+    def __init__(self, path=None, dispatcher=None, reload_interval=1.0, min_interval=0):
+        self.path = path or os.environ.get('GESTURES_CONFIG', DEFAULT_CONFIG)
+        self.dispatcher = dispatcher or get_action_dispatcher()
+        self.reload_interval = reload_interval
+        self.min_interval = min_interval
+        self.table = [None] * 32
+        self.gestures = []
+        self.stamp = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Re-read the config file if it changed; True if the table was replaced"""
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            print(f"Gesture config not readable: {e}", file=sys.stderr)
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return False
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)['gestures']
+            gestures = [Gesture(list(entry['fingers']), entry.get('label', ''), entry['name'],
+                                entry.get('action', 'open_url'), entry.get('target')) for entry in entries]
+            for gesture in gestures:
+                if gesture.action not in ACTIONS or len(gesture.fingers) != 5:
+                    raise ValueError(f"bad gesture entry {gesture.name!r}")
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            print(f"Error loading gesture config {self.path}: {e}", file=sys.stderr)
+            with self.lock:
+                self.stamp = stamp
+            return False
+        table = [None] * 32
+        for gesture in gestures:
+            table[pack_fingers(gesture.fingers)] = gesture
+        with self.lock:
+            self.table = table
+            self.gestures = gestures
+            self.stamp = stamp
+        print(f"Loaded {len(gestures)} gestures from {self.path}", file=sys.stderr)
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self.checked_at >= self.reload_interval:
+            self.checked_at = now
+            self.reload()
+
+    def lookup(self, fingers):
+        """Gesture routed from a fingers-up list (or packed mask), or None"""
+        self._maybe_reload()
+        mask = fingers if isinstance(fingers, int) else pack_fingers(fingers)
+        return self.table[mask]
+
+    def dispatch(self, gesture):
+        """Queue the gesture's action; returns its Future, or None if rejected
+
+        A gesture whose action is still pending is rejected, as is one within
+        `min_interval` seconds of the last accepted (when set).
+        """
+        return self.dispatcher.submit(f"gesture:{gesture.name}", ACTIONS[gesture.action], gesture.target,
+                                      min_interval=self.min_interval)
+
+    def trigger(self, fingers):
+        """lookup() then dispatch(); returns (gesture, future or None) or (None, None)"""
+        gesture = self.lookup(fingers)
+        if gesture is None:
+            return None, None
+        return gesture, self.dispatch(gesture)
+
+    def guide_lines(self):
+        """'label: name' strings in config order, for on-screen help"""
+        self._maybe_reload()
+        return [f"{gesture.label}: {gesture.name}" for gesture in self.gestures]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_gesture_registry():
+    """Process-wide registry for the default config
+
+    GESTURE_MIN_INTERVAL (seconds, default 0) adds a cooldown per gesture.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GestureRegistry(min_interval=float(os.environ.get('GESTURE_MIN_INTERVAL', '0')))
+        return _registry
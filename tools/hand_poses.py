@@ -0,0 +1,83 @@
+"""
+Hand Poses - vectorized gesture classification over landmark batches
+Takes cvzone landmarks as an (N, 21, 3) NumPy array (N hands or N recorded
+frames) and computes finger-extension flags, pinch distances and named poses
+for the whole batch at once, instead of per-landmark Python comparisons.
+"""
+
+from tools.lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Finger tips (index to pinky) and the joints two below them
+FINGER_TIPS = [8, 12, 16, 20]
+FINGER_PIPS = [6, 10, 14, 18]
+WRIST, MIDDLE_MCP = 0, 9
+
+# Thumb-index gap below this fraction of the palm length counts as a pinch
+PINCH_RATIO = 0.25
+
+
+def landmark_array(hands):
+    """Stack cvzone hand dicts into (N, 21, 3) landmarks and an (N,) is-right mask"""
+    if not hands:
+        return np.zeros((0, 21, 3), dtype=np.float32), np.zeros(0, dtype=bool)
+    landmarks = np.array([hand['lmList'] for hand in hands], dtype=np.float32)
+    right = np.array([hand['type'] == "Right" for hand in hands])
+    return landmarks, right
+
+
+def finger_flags(landmarks, right):
+    """(N, 5) fingers-up flags, thumb first
+
+    Same rule as HandDetector.fingersUp: the thumb tip is compared with the
+    joint below it along x (mirrored for left hands), the other tips with the
+    joint two below along y.
+    """
+    landmarks = np.asarray(landmarks)
+    flags = np.empty(landmarks.shape[:1] + (5,), dtype=bool)
+    tip_x, joint_x = landmarks[:, 4, 0], landmarks[:, 3, 0]
+    flags[:, 0] = np.where(right, tip_x > joint_x, tip_x < joint_x)
+    flags[:, 1:] = landmarks[:, FINGER_TIPS, 1] < landmarks[:, FINGER_PIPS, 1]
+    return flags
+
+
+def pinch_distance(landmarks, a=4, b=8):
+    """(N,) image-plane distance between landmarks `a` and `b` (thumb and index tips)"""
+    landmarks = np.asarray(landmarks)
+    return np.hypot(landmarks[:, b, 0] - landmarks[:, a, 0], landmarks[:, b, 1] - landmarks[:, a, 1])
+
+
+def palm_length(landmarks):
+    """(N,) wrist to middle-finger knuckle distance, a scale reference for each hand"""
+    return pinch_distance(landmarks, WRIST, MIDDLE_MCP)
+
+
+def gun_pose(landmarks):
+    """(N,) tool2's gun gesture: thumb and index extended, middle finger curled"""
+    landmarks = np.asarray(landmarks)
+    y = landmarks[:, :, 1]
+    return (y[:, 4] < y[:, 3]) & (y[:, 8] < y[:, 6]) & (y[:, 12] > y[:, 10])
+
+
+def classify(landmarks, right):
+    """Finger flags, counts and named poses for a batch, as a dict of arrays
+
+    Keys: `fingers` (N, 5), `count` (N,), `pinch_distance` (N,), `gun`,
+    `pinch` and `open_palm` (N,) booleans.
+    """
+    fingers = finger_flags(landmarks, right)
+    pinch = pinch_distance(landmarks)
+    return {
+        'fingers': fingers,
+        'count': fingers.sum(axis=1),
+        'pinch_distance': pinch,
+        'gun': gun_pose(landmarks),
+        'pinch': pinch < PINCH_RATIO * palm_length(landmarks),
+        'open_palm': fingers.all(axis=1),
+    }
+
+
+def classify_hands(hands):
+    """classify() for a list of cvzone hand dicts"""
+    return classify(*landmark_array(hands))
@@ -0,0 +1,141 @@
+"""
+Hand Tracker - stable IDs for several hands across detections
+Hands found on consecutive frames are matched to existing tracks by bounding
+box overlap (IoU) against where each track is predicted to be, falling back
+to centre distance for fast movements. Each hand keeps its ID for as long as
+it stays in view, so gesture state can be kept per hand when several visitors
+are in front of the camera.
+
+The tracker also hands out a region of interest around each tracked hand, so
+the detection pool can re-find known hands in small crops and only scan the
+full frame now and then for newcomers.
+"""
+
+import itertools
+import math
+import threading
+
+
+def bbox_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class Track:
+    __slots__ = ('id', 'hand', 'bbox', 'velocity', 'timestamp', 'missed', 'hits')
+
+    def __init__(self, track_id, hand, timestamp):
+        self.id = track_id
+        self.hand = hand
+        self.bbox = tuple(hand['bbox'])
+        self.velocity = (0.0, 0.0)
+        self.timestamp = timestamp
+        self.missed = 0
+        self.hits = 1
+
+    def predict(self, timestamp):
+        """Box moved on by the track's velocity to `timestamp`"""
+        dt = max(timestamp - self.timestamp, 0.0)
+        x, y, w, h = self.bbox
+        return (x + self.velocity[0] * dt, y + self.velocity[1] * dt, w, h)
+
+    def update(self, hand, timestamp):
+        bbox = tuple(hand['bbox'])
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            vx = (bbox[0] + bbox[2] / 2 - self.bbox[0] - self.bbox[2] / 2) / dt
+            vy = (bbox[1] + bbox[3] / 2 - self.bbox[1] - self.bbox[3] / 2) / dt
+            self.velocity = (0.5 * self.velocity[0] + 0.5 * vx, 0.5 * self.velocity[1] + 0.5 * vy)
+        self.hand = hand
+        self.bbox = bbox
+        self.timestamp = timestamp
+        self.missed = 0
+        self.hits += 1
+
+
+class HandTracker:
+    """Assigns stable IDs to hands across detections
+
+    A hand matches a track when its box overlaps the track's predicted box by
+    at least `iou_threshold`, or else when its centre lies within
+    `max_distance` box diagonals of it. Tracks not seen for more than
+    `max_missed` detections are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.1, max_distance=1.0, max_missed=5):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.tracks = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def update(self, hands, timestamp):
+        """Match one detection's hands to tracks; returns copies with an 'id', oldest track first"""
+        with self.lock:
+            pairs = []
+            for t, track in enumerate(self.tracks):
+                box = track.predict(timestamp)
+                diagonal = math.hypot(box[2], box[3]) or 1.0
+                for h, hand in enumerate(hands):
+                    iou = bbox_iou(box, hand['bbox'])
+                    if iou >= self.iou_threshold:
+                        pairs.append((1.0 + iou, t, h))
+                        continue
+                    x, y, w, hgt = hand['bbox']
+                    distance = math.hypot(x + w / 2 - box[0] - box[2] / 2, y + hgt / 2 - box[1] - box[3] / 2) / diagonal
+                    if distance <= self.max_distance:
+                        # Always ranks below any overlap match
+                        pairs.append((1.0 - distance / self.max_distance, t, h))
+            pairs.sort(reverse=True)
+
+            matched_tracks, matched_hands = set(), set()
+            for _, t, h in pairs:
+                if t in matched_tracks or h in matched_hands:
+                    continue
+                self.tracks[t].update(hands[h], timestamp)
+                matched_tracks.add(t)
+                matched_hands.add(h)
+
+            tracks = []
+            for t, track in enumerate(self.tracks):
+                if t not in matched_tracks:
+                    track.missed += 1
+                    if track.missed > self.max_missed:
+                        continue
+                tracks.append(track)
+            for h, hand in enumerate(hands):
+                if h not in matched_hands:
+                    tracks.append(Track(next(self.ids), hand, timestamp))
+            self.tracks = tracks
+            return [dict(track.hand, id=track.id) for track in tracks if track.missed == 0]
+
+    def rois(self, width, height, timestamp, scale=1.8, min_side=64):
+        """(track id, (x0, y0, x1, y1)) squares around where each visible hand should be now"""
+        with self.lock:
+            rois = []
+            for track in self.tracks:
+                if track.missed:
+                    continue
+                x, y, w, h = track.predict(timestamp)
+                side = max(max(w, h) * scale, min_side)
+                cx, cy = x + w / 2, y + h / 2
+                x0, y0 = max(int(cx - side / 2), 0), max(int(cy - side / 2), 0)
+                x1, y1 = min(int(cx + side / 2), width), min(int(cy + side / 2), height)
+                if x1 - x0 > 1 and y1 - y0 > 1:
+                    rois.append((track.id, (x0, y0, x1, y1)))
+            return rois
+
+    def reset(self):
+        with self.lock:
+            self.tracks = []
+
+    def __len__(self):
+        return len(self.tracks)
@@ -0,0 +1,158 @@
+"""
+Image Pyramid - constant-cost zoom rendering for large images
+An uploaded image is stored as power-of-two levels split into fixed-size tiles.
+Rendering a zoomed view picks the nearest level at or above the needed
+resolution and resamples only the tiles under the viewport, so the cost
+depends on the viewport size, not on the image size or the zoom scale.
+"""
+
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+TILE_SIZE = 256
+TILE_QUALITY = 90
+MANIFEST = 'pyramid.json'
+
+
+class ImagePyramid:
+    """Power-of-two levels of an image, split into TILE_SIZE tiles
+
+    Level 0 is the full image and each level above halves both sides.
+    """
+
+    def __init__(self, width, height, level_sizes, load_tile, tile_size=TILE_SIZE, cache_tiles=256):
+        self.width = width
+        self.height = height
+        self.level_sizes = level_sizes
+        self.tile_size = tile_size
+        self.load_tile = load_tile
+        self.cache_tiles = cache_tiles
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, img, tile_size=TILE_SIZE):
+        """Build all levels in memory; tiles are views, not copies"""
+        levels = [img]
+        while max(levels[-1].shape[:2]) > tile_size:
+            h, w = levels[-1].shape[:2]
+            levels.append(cv2.resize(levels[-1], (max(w // 2, 1), max(h // 2, 1)), interpolation=cv2.INTER_AREA))
+        sizes = [(level.shape[1], level.shape[0]) for level in levels]
+
+        def load_tile(level, row, col):
+            return levels[level][row * tile_size:(row + 1) * tile_size, col * tile_size:(col + 1) * tile_size]
+
+        # Everything is already in memory, so there is nothing to evict
+        return cls(img.shape[1], img.shape[0], sizes, load_tile, tile_size, cache_tiles=0)
+
+    @classmethod
+    def load(cls, directory):
+        """Open a pyramid written by save(); tiles are read on demand"""
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+
+        # Pyramids saved before tiles became JPEG have no 'format'
+        ext = manifest.get('format', 'png')
+
+        def load_tile(level, row, col):
+            return cv2.imread(os.path.join(directory, str(level), f"{row}_{col}.{ext}"))
+
+        sizes = [tuple(size) for size in manifest['levels']]
+        return cls(manifest['width'], manifest['height'], sizes, load_tile, manifest['tile_size'])
+
+    def save(self, directory, quality=TILE_QUALITY):
+        """Write every tile as JPEG, then the JSON manifest
+
+        The manifest is written last, so a directory with one holds a
+        complete pyramid. JPEG keeps the tiles near the size of the upload;
+        lossless PNG tiles of a camera photo come out ten times larger.
+        """
+        for level, (w, h) in enumerate(self.level_sizes):
+            level_dir = os.path.join(directory, str(level))
+            os.makedirs(level_dir, exist_ok=True)
+            for row in range(math.ceil(h / self.tile_size)):
+                for col in range(math.ceil(w / self.tile_size)):
+                    cv2.imwrite(os.path.join(level_dir, f"{row}_{col}.jpg"), self.tile(level, row, col),
+                                [cv2.IMWRITE_JPEG_QUALITY, quality])
+        tmp = os.path.join(directory, MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'width': self.width, 'height': self.height, 'tile_size': self.tile_size,
+                       'levels': self.level_sizes, 'format': 'jpg'}, f)
+        os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    @staticmethod
+    def saved(directory):
+        """Whether save() has finished writing a pyramid to `directory`"""
+        return os.path.exists(os.path.join(directory, MANIFEST))
+
+    def tile(self, level, row, col):
+        if not self.cache_tiles:
+            return self.load_tile(level, row, col)
+        key = (level, row, col)
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+        tile = self.load_tile(level, row, col)
+        with self.lock:
+            self.tiles[key] = tile
+            while len(self.tiles) > self.cache_tiles:
+                self.tiles.popitem(last=False)
+        return tile
+
+    def level_for(self, scale):
+        """Coarsest level whose resolution is still at least `scale`"""
+        if scale >= 1.0:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / scale))), len(self.level_sizes) - 1)
+
+    def render(self, scale, size=(1280, 720), center=None):
+        """Render the image zoomed by `scale` into a viewport of `size`
+
+        `center` is the image point (full-resolution pixels) shown in the
+        middle of the viewport and defaults to the image centre. Areas outside
+        the image are black, as with the old resize-then-pad approach.
+        """
+        out_w, out_h = size
+        cx, cy = center if center is not None else (self.width / 2, self.height / 2)
+        level = self.level_for(scale)
+        level_w, level_h = self.level_sizes[level]
+        factor = level_w / self.width
+        level_scale = scale / factor
+
+        # Visible rectangle in level pixels, clipped to the level
+        half_w, half_h = out_w / 2 / level_scale, out_h / 2 / level_scale
+        x0, y0 = cx * factor - half_w, cy * factor - half_h
+        x1, y1 = cx * factor + half_w, cy * factor + half_h
+        ts = self.tile_size
+        col0, col1 = max(int(x0 // ts), 0), min(int(math.ceil(x1 / ts)), math.ceil(level_w / ts))
+        row0, row1 = max(int(y0 // ts), 0), min(int(math.ceil(y1 / ts)), math.ceil(level_h / ts))
+        if col0 >= col1 or row0 >= row1:
+            return np.zeros((out_h, out_w, 3), dtype=np.uint8)
+
+        # Stitch only the tiles under the viewport
+        mosaic_w = min(col1 * ts, level_w) - col0 * ts
+        mosaic_h = min(row1 * ts, level_h) - row0 * ts
+        mosaic = np.empty((mosaic_h, mosaic_w, 3), dtype=np.uint8)
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                tile = self.tile(level, row, col)
+                y, x = (row - row0) * ts, (col - col0) * ts
+                mosaic[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+
+        # One affine resample from mosaic pixels to viewport pixels
+        origin_x, origin_y = col0 * ts, row0 * ts
+        matrix = np.float32([
+            [level_scale, 0, (origin_x - x0) * level_scale],
+            [0, level_scale, (origin_y - y0) * level_scale],
+        ])
+        return cv2.warpAffine(mosaic, matrix, (out_w, out_h), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
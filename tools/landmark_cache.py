@@ -0,0 +1,183 @@
+"""
+Landmark Cache - reuse hand landmarks for frames that were already analysed
+Detection results are kept in a bounded LRU keyed by a fingerprint of the
+frame (a hash of a 64x36 grey thumbnail) and the detector settings. Live
+camera frames also key on their capture sequence number, so the detection
+pool and the tool3 zoom loop share one inference per frame, but two captures
+that happen to look alike at thumbnail size never do. Replayed frames key on
+content alone, so a looping replay or a benchmark run several times over one
+recording hits on frames it has seen before.
+
+Entries expire after a TTL and the cache stays under an entry and memory cap.
+If two threads ask for the same frame at once, one runs the detector and the
+other waits for its result. Hits, misses and the inference time saved are
+reported in /pipeline_stats.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# Rough in-memory size of one cached hand (21 landmarks, bbox, dict overhead)
+HAND_BYTES = 4096
+ENTRY_BYTES = 256
+
+
+def frame_fingerprint(img, size=(64, 36)):
+    """Short hash of a downsampled grey copy of `img` plus its shape"""
+    small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    digest = hashlib.blake2b(small.tobytes(), digest_size=12)
+    digest.update(repr(img.shape).encode())
+    return digest.digest()
+
+
+class _Entry:
+    __slots__ = ('hands', 'seconds', 'expires', 'size')
+
+    def __init__(self, hands, seconds, expires):
+        self.hands = hands
+        self.seconds = seconds
+        self.expires = expires
+        self.size = ENTRY_BYTES + HAND_BYTES * len(hands)
+
+
+class LandmarkCache:
+    """Bounded LRU of detection results with a TTL
+
+    Cached hand lists are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=16 * 1024 * 1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.frame_keys = OrderedDict()
+        self.pending = {}
+        self.bytes = 0
+        self.counts = {'hits': 0, 'misses': 0, 'waits': 0, 'evicted': 0, 'expired': 0}
+        self.saved_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, img, compute, params=(), frame_id=None, match_content=False):
+        """Cached result for `img` under `params`, or compute() and cache it
+
+        `frame_id` (e.g. (camera, seq)) is part of the key, so only the same
+        capture hits, and lets callers that saw the frame skip the
+        fingerprint. With `match_content` (replayed frames) it only aliases
+        the content key and any frame that looks the same hits.
+        """
+        frame_key = (frame_id, params) if frame_id is not None else None
+        with self.lock:
+            key = self.frame_keys.get(frame_key) if frame_key is not None else None
+        if key is None:
+            fingerprint = frame_fingerprint(img)
+            key = (fingerprint, params) if frame_key is None or match_content else (fingerprint, frame_id, params)
+
+        while True:
+            with self.lock:
+                hands = self._lookup(key)
+                if hands is not None:
+                    self._remember(frame_key, key)
+                    return hands
+                done = self.pending.get(key)
+                if done is None:
+                    done = self.pending[key] = threading.Event()
+                    self.counts['misses'] += 1
+                    break
+                self.counts['waits'] += 1
+            # Another thread is running the detector on this frame
+            done.wait()
+
+        start = time.monotonic()
+        try:
+            hands = compute()
+            seconds = time.monotonic() - start
+            with self.lock:
+                self._store(key, hands, seconds)
+                self._remember(frame_key, key)
+            return hands
+        finally:
+            with self.lock:
+                del self.pending[key]
+            done.set()
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            self._drop(key)
+            self.counts['expired'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.counts['hits'] += 1
+        self.saved_seconds += entry.seconds
+        return entry.hands
+
+    def _store(self, key, hands, seconds):
+        if key in self.entries:
+            self._drop(key)
+        entry = _Entry(hands, seconds, time.monotonic() + self.ttl)
+        self.entries[key] = entry
+        self.bytes += entry.size
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+            self.counts['evicted'] += 1
+
+    def _remember(self, frame_key, key):
+        if frame_key is None:
+            return
+        self.frame_keys[frame_key] = key
+        self.frame_keys.move_to_end(frame_key)
+        while len(self.frame_keys) > self.max_entries:
+            self.frame_keys.popitem(last=False)
+
+    def _drop(self, key):
+        self.bytes -= self.entries.pop(key).size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.frame_keys.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return dict(
+                self.counts,
+                entries=len(self.entries),
+                bytes=self.bytes,
+                hit_rate=round(self.counts['hits'] / lookups, 3) if lookups else None,
+                saved_ms=round(self.saved_seconds * 1000, 1),
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_landmark_cache():
+    """Process-wide cache, or None with LANDMARK_CACHE=0
+
+    LANDMARK_CACHE_TTL (seconds) and LANDMARK_CACHE_MB set the TTL and memory cap.
+    """
+    global _cache
+    if os.environ.get('LANDMARK_CACHE', '1') == '0':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LandmarkCache(
+                ttl=float(os.environ.get('LANDMARK_CACHE_TTL', '30')),
+                max_bytes=int(float(os.environ.get('LANDMARK_CACHE_MB', '16')) * 1024 * 1024),
+            )
+        return _cache
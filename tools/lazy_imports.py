@@ -0,0 +1,78 @@
+"""
+Lazy Imports - defer heavy modules until they are first used
+`cv2 = lazy_import('cv2')` binds a stand-in that imports OpenCV on the first
+attribute access, so importing app.py (and serving the landing pages)
+does not pay for OpenCV or NumPy. warm_up() loads them ahead of time, and
+import_report() shows what a cold `import app` really costs.
+"""
+
+import importlib
+import importlib.util
+import os
+import subprocess
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on first attribute access
+
+    The real module's namespace is then copied in, so later lookups are plain
+    attribute hits. The import itself goes through importlib's per-module
+    locks, so threads racing on first use are safe.
+    """
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """Module `name`, or a LazyModule for it if it is not imported yet
+
+    Raises ImportError straight away if the module cannot be found.
+    """
+    module = sys.modules.get(name)
+    # A module another thread is still importing is not safe to hand out yet
+    if module is not None and not getattr(getattr(module, '__spec__', None), '_initializing', False):
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
+
+
+def warm_up(names):
+    """Fully load each module in `names`; returns {name: error} for failures"""
+    errors = {}
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            errors[name] = e
+    return errors
+
+
+def import_report(statement='import app', cwd=None, top=20):
+    """Run `statement` in a fresh interpreter under -X importtime
+
+    Returns (total_seconds, rows) where rows are (cumulative_us, self_us,
+    module) for the `top` slowest imports, slowest first.
+    """
+    env = dict(os.environ, APP_WARMUP='0', TOOL_WORKERS_WARM='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level
+        if not name[1:].startswith(' '):
+            total += int(cumulative_us)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return total / 1e6, rows[:top]
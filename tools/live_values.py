@@ -0,0 +1,121 @@
+"""
+Live Values - push tool readings to the browser with Server-Sent Events
+Tools publish numeric readings (tool3 zoom scale, tool5 volume) here; each open
+page holds one /events connection and only receives a value when it moves by
+more than its epsilon, at most once per frame interval. Values are kept in a
+StateStore under "live.<name>", so every server worker sees the same readings.
+"""
+
+import asyncio
+import json
+import time
+
+from tools.state_store import StateStore
+
+PREFIX = 'live.'
+
+
+class LiveValues:
+    """Named numeric values with change notification"""
+
+    def __init__(self, epsilons=None, store=None):
+        self.epsilons = dict(epsilons or {})
+        self.store = store if store is not None else StateStore()
+
+    def publish(self, name, value):
+        """Store `value`; wake listeners only if it moved more than epsilon"""
+        value = float(value)
+        epsilon = self.epsilons.get(name, 0.0)
+
+        def moved(last):
+            return value if last is None or abs(value - last) > epsilon else last
+
+        return self.store.update(PREFIX + name, moved)[1] is not None
+
+    def setdefault(self, name, value):
+        """Publish `value` unless another worker already published `name`"""
+        self.store.compare_and_set(PREFIX + name, None, float(value))
+
+    def get(self, name, default=None):
+        return self.store.get(PREFIX + name, default)
+
+    def wait(self, since_version, names=None, timeout=15.0):
+        """Block until a value in `names` changes after `since_version`
+
+        Returns (version, {name: value}) with every value that changed; the
+        dict is empty on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return since_version, {}
+            since_version, changed = self.store.wait(since_version, self._keys(names), remaining)
+            # Without `names` the store also reports keys that are not live values
+            changed = self._filter(changed, names)
+            if changed:
+                return since_version, changed
+
+    async def wait_async(self, since_version, names=None, timeout=15.0):
+        """wait() for coroutines"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return since_version, {}
+            since_version, changed = await self.store.wait_async(since_version, self._keys(names), remaining)
+            changed = self._filter(changed, names)
+            if changed:
+                return since_version, changed
+
+    def _keys(self, names):
+        return {PREFIX + name for name in names} if names is not None else None
+
+    def _filter(self, values, names):
+        return {
+            key[len(PREFIX):]: value for key, value in values.items()
+            if key.startswith(PREFIX) and (names is None or key[len(PREFIX):] in names)
+        }
+
+    def stream(self, names=None, min_interval=1 / 30, keepalive=15.0):
+        """Generator of text/event-stream messages for one client
+
+        The current values are sent first. After that, changes arriving within
+        `min_interval` of the previous message are coalesced into the next one.
+        """
+        version, current = self.store.changes(0, self._keys(names))
+        current = self._filter(current, names)
+        if current:
+            yield _sse_message(current)
+        while True:
+            version, changed = self.wait(version, names, keepalive)
+            if not changed:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            sent_at = time.monotonic()
+            yield _sse_message(changed)
+            delay = min_interval - (time.monotonic() - sent_at)
+            if delay > 0:
+                time.sleep(delay)
+
+    async def stream_async(self, names=None, min_interval=1 / 30, keepalive=15.0):
+        """stream() as an async generator, for the ASGI server"""
+        version, current = self.store.changes(0, self._keys(names))
+        current = self._filter(current, names)
+        if current:
+            yield _sse_message(current)
+        while True:
+            version, changed = await self.wait_async(version, names, keepalive)
+            if not changed:
+                yield ': keepalive\n\n'
+                continue
+            sent_at = time.monotonic()
+            yield _sse_message(changed)
+            delay = min_interval - (time.monotonic() - sent_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+def _sse_message(values):
+    return f"event: values\ndata: {json.dumps(values)}\n\n"
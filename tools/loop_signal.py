@@ -0,0 +1,62 @@
+"""
+Loop Signal - wake asyncio coroutines from worker threads
+Producer threads (the MJPEG broadcasters, the state store watcher) call
+notify() after publishing something new; coroutines on any event loop await
+the signal instead of holding a thread per client. Each loop gets one shared
+future per notification, so a frame wakes a thousand viewers with a single
+call_soon_threadsafe().
+"""
+
+import asyncio
+import threading
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LoopSignal:
+    """Thread-safe "something changed" notification for coroutines
+
+    Check for new data after calling future() and before awaiting it, so a
+    notify() in between is not missed:
+
+        future = signal.future()
+        if nothing_new():
+            await signal.wait(future, timeout)
+    """
+
+    def __init__(self):
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def future(self):
+        """Future on the running loop resolved by the next notify()"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            future = self.futures.get(loop)
+            if future is None or future.done():
+                future = self.futures[loop] = loop.create_future()
+        return future
+
+    async def wait(self, future, timeout):
+        """Await `future` for up to `timeout` seconds; False on timeout"""
+        try:
+            # shield: a timed-out waiter must not cancel the shared future
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def notify(self):
+        """Wake every coroutine waiting on the signal; callable from any thread"""
+        with self.lock:
+            for loop, future in list(self.futures.items()):
+                if future.done():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(_resolve, future)
+                except RuntimeError:
+                    # The loop has been closed
+                    del self.futures[loop]
@@ -0,0 +1,393 @@
+"""
+MJPEG Broadcaster - encode-once fan-out for the video feeds
+A single producer thread runs the tool's per-frame processing and JPEG encode
+once per camera frame and hands the same bytes to every connected viewer.
+Slow viewers skip straight to the newest frame instead of queuing.
+
+Processing and encoding run as two stages of a StagedPipeline: the tool's
+processor on one thread (it keeps per-frame state), JPEG encoding on
+<NAME>_ENCODE_WORKERS threads (default 2), so on a multi-core host frame N+1
+is annotated while frame N is still being encoded. Frames leave in capture
+order.
+
+Each stream has a quality ladder (JPEG quality and output scale). Viewers that
+fall behind step down the ladder and step back up once they keep pace; every
+tier in use is still encoded only once per frame.
+
+stream() serves a viewer from a WSGI worker thread; stream_async() serves it
+from an asyncio event loop (see asgi.py), so viewers cost no thread at all.
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+
+from tools.camera_service import RateMeter, get_camera
+from tools.loop_signal import LoopSignal
+from tools.motion_gate import MotionGate
+from tools.stage_tracer import get_tracer
+from tools.staged_pipeline import Stage, StagedPipeline
+
+BOUNDARY = b'--frame'
+
+
+def mjpeg_part(jpeg_bytes):
+    """Wrap encoded JPEG bytes as one multipart/x-mixed-replace part"""
+    return BOUNDARY + b'\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n'
+
+
+class StreamSettings:
+    """JPEG quality, output scale, frame cap, stage HUD and encoder threads for one stream"""
+
+    def __init__(self, quality=80, scale=1.0, max_fps=0, adaptive=True, hud=False, encode_workers=2):
+        self.quality = quality
+        self.scale = scale
+        self.max_fps = max_fps
+        self.adaptive = adaptive
+        self.hud = hud
+        self.encode_workers = encode_workers
+
+    @classmethod
+    def from_env(cls, name):
+        """Read <NAME>_JPEG_QUALITY, _STREAM_SCALE, _MAX_FPS, _ADAPTIVE_JPEG, _HUD and _ENCODE_WORKERS"""
+        prefix = name.upper()
+        return cls(
+            quality=int(os.environ.get(f'{prefix}_JPEG_QUALITY', '80')),
+            scale=float(os.environ.get(f'{prefix}_STREAM_SCALE', '1.0')),
+            max_fps=float(os.environ.get(f'{prefix}_MAX_FPS', '0')),
+            adaptive=os.environ.get(f'{prefix}_ADAPTIVE_JPEG', '1') != '0',
+            hud=os.environ.get(f'{prefix}_HUD', '0') == '1',
+            encode_workers=int(os.environ.get(f'{prefix}_ENCODE_WORKERS', '2')),
+        )
+
+    def tiers(self):
+        """Quality ladder as (jpeg quality, scale) pairs, best first"""
+        if not self.adaptive:
+            return [(self.quality, self.scale)]
+        return [
+            (self.quality, self.scale),
+            (max(self.quality - 20, 20), self.scale),
+            (max(self.quality - 35, 20), self.scale * 0.75),
+            (max(self.quality - 45, 20), self.scale * 0.5),
+        ]
+
+    def to_dict(self):
+        return {'quality': self.quality, 'scale': self.scale, 'max_fps': self.max_fps, 'adaptive': self.adaptive,
+                'hud': self.hud, 'encode_workers': self.encode_workers}
+
+
+class Viewer:
+    """One connected client: its quality tier and delivery statistics"""
+
+    # Consecutive late frames before stepping down, on-time frames before stepping up
+    DOWNGRADE_AFTER = 3
+    UPGRADE_AFTER = 30
+
+    def __init__(self, viewer_id, max_tier, window=2.0):
+        self.id = viewer_id
+        self.tier = 0
+        self.max_tier = max_tier
+        self.window = window
+        self.late = 0
+        self.late_at = 0.0
+        self.on_time = 0
+        self.dropped = 0
+        self.sent = deque()
+
+    def record(self, size, write_seconds, skipped, frame_interval):
+        """Account for one delivered frame and adjust the tier"""
+        now = time.monotonic()
+        self.sent.append((now, size))
+        while self.sent and now - self.sent[0][0] > self.window:
+            self.sent.popleft()
+        self.dropped += skipped
+        # The server returns to the generator only after the previous chunk was
+        # written, so a slow write or skipped frames mean the socket is behind
+        if skipped or write_seconds > frame_interval:
+            # Every frame missed during one long stall counts as late
+            self.late += min(max(skipped, 1), self.DOWNGRADE_AFTER)
+            self.late_at = now
+            self.on_time = 0
+            if self.late >= self.DOWNGRADE_AFTER and self.tier < self.max_tier:
+                self.tier += 1
+                self.late = 0
+        else:
+            self.on_time += 1
+            self.late = 0
+            # A burst of frames accepted by a freshly drained socket buffer is
+            # not keeping pace: also wait that many frame intervals of real time
+            recovered = now - self.late_at >= self.UPGRADE_AFTER * frame_interval
+            if self.on_time >= self.UPGRADE_AFTER and recovered and self.tier > 0:
+                self.tier -= 1
+                self.on_time = 0
+
+    def bitrate(self):
+        """Bits per second delivered over the rolling window"""
+        if len(self.sent) < 2:
+            return 0.0
+        span = max(self.sent[-1][0] - self.sent[0][0], 1e-6)
+        return sum(size for _, size in itertools.islice(self.sent, 1, None)) * 8 / span
+
+
+class MJPEGBroadcaster:
+    """Shares one processing + encoding pipeline between all stream viewers
+
+    `make_processor()` is called each time the producer starts and must return
+    a function taking a camera frame and returning the annotated BGR image. If
+    that function has a `close` attribute it is called when the producer stops.
+    If it has an `is_idle` attribute, frames are skipped while `is_idle()` is
+    true and the motion gate sees no change; viewers keep the last JPEG.
+
+    Stage timings go to get_tracer(name): frame_age (camera to producer),
+    whatever the processor marks itself, process (the rest of the processor),
+    encode_wait (queued for an encoder), encode, total (camera to published
+    JPEG) and write (per viewer).
+    """
+
+    def __init__(self, name, make_processor, camera_source=None, settings=None, motion_gate=None):
+        self.name = name
+        self.make_processor = make_processor
+        self.camera_source = camera_source
+        self.settings = settings or StreamSettings.from_env(name)
+        self.tiers = self.settings.tiers()
+        self.motion_gate = motion_gate or MotionGate.from_env()
+        self.viewers = {}
+        self.viewer_ids = itertools.count(1)
+        self.running = False
+        self.thread = None
+        self.pipeline = None
+        self.generation = 0
+        self.seq = 0
+        self.parts = {}
+        self.frames_encoded = 0
+        self.stream_rate = RateMeter()
+        self.tracer = get_tracer(name)
+        self.lock = threading.Lock()
+        self.frame_ready = threading.Condition()
+        self.frame_signal = LoopSignal()
+
+    def stream(self):
+        """Generator yielding multipart chunks for one HTTP viewer"""
+        viewer, last_seq = self._attach()
+        resumed = None
+        try:
+            while True:
+                with self.frame_ready:
+                    while self.seq <= last_seq and self.running:
+                        self.frame_ready.wait(1.0)
+                    if not self.running:
+                        break
+                    part, skipped, last_seq = self._next_part(viewer, last_seq)
+                if resumed is not None:
+                    viewer.record(len(part), resumed, skipped, self._frame_interval())
+                sent_at = time.monotonic()
+                yield part
+                resumed = time.monotonic() - sent_at
+                self.tracer.record('write', resumed)
+        finally:
+            self._detach(viewer)
+
+    async def stream_async(self):
+        """Async generator of multipart chunks for one viewer on an event loop
+
+        The consumer should resume it only once the previous chunk has been
+        sent, like the WSGI server does, so a slow socket shows up as a slow
+        send and the viewer drops frames or steps down the quality ladder.
+        """
+        viewer, last_seq = self._attach()
+        resumed = None
+        try:
+            while True:
+                future = self.frame_signal.future()
+                with self.frame_ready:
+                    if not self.running:
+                        break
+                    if self.seq <= last_seq:
+                        part = None
+                    else:
+                        part, skipped, last_seq = self._next_part(viewer, last_seq)
+                if part is None:
+                    await self.frame_signal.wait(future, 1.0)
+                    continue
+                if resumed is not None:
+                    viewer.record(len(part), resumed, skipped, self._frame_interval())
+                sent_at = time.monotonic()
+                yield part
+                resumed = time.monotonic() - sent_at
+                self.tracer.record('write', resumed)
+        finally:
+            self._detach(viewer)
+
+    def _attach(self):
+        viewer = Viewer(next(self.viewer_ids), len(self.tiers) - 1)
+        with self.lock:
+            self.viewers[viewer.id] = viewer
+            if not self.running:
+                self._start()
+            # New viewers get the current frame straight away, if there is one
+            last_seq = self.seq - 1 if self.parts else self.seq
+        return viewer, last_seq
+
+    def _next_part(self, viewer, last_seq):
+        # Called with frame_ready held and a frame newer than last_seq
+        skipped = self.seq - last_seq - 1
+        # Fall back to any encoded tier right after a tier change
+        part = self.parts.get(viewer.tier) or next(iter(self.parts.values()))
+        return part, skipped, self.seq
+
+    def _detach(self, viewer):
+        with self.lock:
+            del self.viewers[viewer.id]
+            if not self.viewers:
+                self._stop()
+        if viewer.dropped:
+            print(f"{self.name} viewer {viewer.id} skipped {viewer.dropped} frames", file=sys.stderr)
+
+    def stop(self):
+        """Stop the producer and end every viewer's stream"""
+        with self.lock:
+            self._stop()
+
+    def is_running(self):
+        return self.running
+
+    def stats(self):
+        viewers = list(self.viewers.values())
+        pipeline = self.pipeline
+        return {
+            'name': self.name,
+            'running': self.running,
+            'subscribers': len(viewers),
+            'frames_encoded': self.frames_encoded,
+            'stream_fps': round(self.stream_rate.rate(), 1),
+            'settings': self.settings.to_dict(),
+            'motion_gate': self.motion_gate.stats(),
+            'pipeline': pipeline.stats() if pipeline else None,
+            'viewers': [{
+                'id': viewer.id,
+                'quality': self.tiers[viewer.tier][0],
+                'scale': self.tiers[viewer.tier][1],
+                'kbps': round(viewer.bitrate() / 1000, 1),
+                'dropped': viewer.dropped,
+            } for viewer in viewers],
+        }
+
+    def _frame_interval(self):
+        fps = self.stream_rate.rate()
+        return 1.0 / fps if fps > 0 else 1.0
+
+    def _start(self):
+        self.running = True
+        self.parts = {}
+        self.motion_gate.reset()
+        self.generation += 1
+        self.thread = threading.Thread(target=self._produce, args=(self.generation,), name=f"{self.name}-broadcaster")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _stop(self):
+        self.running = False
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+        self.frame_signal.notify()
+
+    def _producing(self, generation):
+        return self.running and self.generation == generation
+
+    def _encode(self, img, tier):
+        quality, scale = self.tiers[tier]
+        if scale != 1.0:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return mjpeg_part(buffer.tobytes()) if ret else None
+
+    def _process_stage(self, process):
+        def run(packet):
+            trace = self.tracer.begin(packet.timestamp)
+            trace.mark('frame_age')
+            img = process(packet.image)
+            trace.mark('process')
+            if self.settings.hud:
+                self.tracer.draw_hud(img)
+            return img, trace
+        return run
+
+    def _encode_stage(self, item):
+        img, trace = item
+        trace.mark('encode_wait')
+        # Encode each tier somebody is watching, once
+        tiers = {viewer.tier for viewer in list(self.viewers.values())} or {0}
+        parts = {}
+        for tier in tiers:
+            part = self._encode(img, tier)
+            if part is not None:
+                parts[tier] = part
+        if not parts:
+            return None
+        trace.mark('encode')
+        return parts, trace
+
+    def _publisher(self, generation):
+        def publish(item):
+            parts, trace = item
+            if not self._producing(generation):
+                return
+            with self.frame_ready:
+                self.seq += 1
+                self.parts = parts
+                self.frames_encoded += 1
+                self.frame_ready.notify_all()
+            self.frame_signal.notify()
+            self.stream_rate.tick()
+            trace.end()
+        return publish
+
+    def _produce(self, generation):
+        camera = get_camera(self.camera_source).acquire()
+        process = None
+        pipeline = None
+        min_interval = 1.0 / self.settings.max_fps if self.settings.max_fps else 0
+        last_frame_time = 0
+        try:
+            process = self.make_processor()
+            is_idle = getattr(process, 'is_idle', None)
+            pipeline = self.pipeline = StagedPipeline(self.name, [
+                Stage('process', self._process_stage(process)),
+                Stage('encode', self._encode_stage, workers=self.settings.encode_workers),
+            ], self._publisher(generation)).start()
+            for packet in camera.frames():
+                if not self._producing(generation) or not pipeline.running:
+                    break
+                if packet.timestamp - last_frame_time < min_interval:
+                    continue
+                last_frame_time = packet.timestamp
+                # Nothing on screen is changing: the last JPEG is still right
+                if is_idle is not None and is_idle() and not self.motion_gate.changed(packet.image, packet.timestamp):
+                    continue
+                pipeline.submit(packet)
+            if pipeline.error is not None:
+                raise pipeline.error
+        except Exception as e:
+            print(f"Error in {self.name} broadcaster: {e}", file=sys.stderr)
+        finally:
+            if pipeline is not None:
+                # The processor must be done with its last frame before close()
+                pipeline.stop()
+                with self.lock:
+                    if self.pipeline is pipeline:
+                        self.pipeline = None
+            close = getattr(process, 'close', None)
+            if close is not None:
+                close()
+            camera.release()
+            # A newer producer may already have taken over after a restart
+            with self.lock:
+                if self.generation == generation:
+                    self._stop()
@@ -0,0 +1,76 @@
+"""
+Motion Gate - skip work on frames that have not changed
+Compares a tiny grayscale thumbnail of each frame with the last frame that was
+let through. Static scenes skip detection and re-encoding, with a forced
+refresh every few seconds so nothing goes stale for long.
+"""
+
+import os
+import threading
+import time
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+
+
+class MotionGate:
+    """Cheap changed/unchanged test on a downsampled grayscale frame
+
+    `threshold` is the mean absolute pixel difference (0-255) needed to count
+    as motion; 0 lets every frame through.
+    """
+
+    def __init__(self, threshold=2.0, refresh_interval=2.0, width=64):
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.width = width
+        self.reference = None
+        self.reference_time = 0
+        self.passed = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Read MOTION_THRESHOLD and MOTION_REFRESH_SECONDS"""
+        return cls(
+            threshold=float(os.environ.get('MOTION_THRESHOLD', '2.0')),
+            refresh_interval=float(os.environ.get('MOTION_REFRESH_SECONDS', '2.0')),
+        )
+
+    def thumbnail(self, img):
+        h, w = img.shape[:2]
+        height = max(round(h * self.width / w), 1)
+        small = cv2.resize(img, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def changed(self, img, now=None):
+        """Return True if `img` differs enough from the last frame let through"""
+        if self.threshold <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        small = self.thumbnail(img)
+        with self.lock:
+            stale = now - self.reference_time >= self.refresh_interval
+            if self.reference is None or self.reference.shape != small.shape or stale \
+                    or cv2.absdiff(small, self.reference).mean() > self.threshold:
+                # Only moving the reference on a pass lets slow drift add up
+                self.reference = small
+                self.reference_time = now
+                self.passed += 1
+                return True
+            self.skipped += 1
+            return False
+
+    def reset(self):
+        with self.lock:
+            self.reference = None
+
+    def stats(self):
+        total = self.passed + self.skipped
+        return {
+            'threshold': self.threshold,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skipped / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,114 @@
+"""
+Overlay Cache - pre-rendered text overlays for the video streams
+Static HUD text (the gesture guide, the FIRE! banner) is rasterized once per
+frame size into a cached layer and composited with one masked copy, instead
+of running cv2.putText for every line on every frame. The copy gives exactly
+the pixels putText would have drawn.
+"""
+
+import threading
+from collections import OrderedDict
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+
+class TextOverlay:
+    """Cached text layer composited onto frames
+
+    `lines(width, height)` returns a list of (text, (x, y), font_scale, bgr,
+    thickness) tuples, matching cv2.putText's arguments; `font` defaults to
+    FONT_HERSHEY_SIMPLEX. The layer is re-drawn only when the frame size or
+    the returned lines change.
+
+    `line_type` defaults to cv2.LINE_8, putText's default in OpenCV 4, where
+    the text has hard edges and the layer is a plain mask. Anti-aliased text
+    can't be cached without changing the result, so when the text comes out
+    anti-aliased (cv2.LINE_AA, or an OpenCV build that always smooths text)
+    apply() falls back to putText. With `opacity` below 1 the layer is
+    blended instead.
+    """
+
+    def __init__(self, lines, font=None, opacity=1.0, cache_size=16, line_type=None):
+        self.lines = lines
+        self.font = font
+        self.line_type = line_type
+        self.opacity = opacity
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def apply(self, img):
+        """Draw the overlay onto `img` in place and return it"""
+        h, w = img.shape[:2]
+        key = (w, h, tuple(self.lines(w, h)))
+        layer = self._layer(key)
+        if layer is None:
+            return img
+        x0, y0, color, mask, keep = layer
+        if color is None:
+            self._draw(img, key[2])
+            return img
+        roi = img[y0:y0 + color.shape[0], x0:x0 + color.shape[1]]
+        if keep is None:
+            # Hard-edged text: one masked copy straight into the ROI view
+            cv2.copyTo(color, mask, roi)
+        else:
+            # Translucent: roi * (1 - alpha) + premultiplied colour
+            cv2.add(cv2.multiply(roi, keep, scale=1 / 255.0), color, dst=roi)
+        return img
+
+    def _draw(self, img, lines):
+        font = cv2.FONT_HERSHEY_SIMPLEX if self.font is None else self.font
+        line_type = cv2.LINE_8 if self.line_type is None else self.line_type
+        for text, org, scale, color, thickness in lines:
+            cv2.putText(img, text, org, font, scale, color, thickness, line_type)
+
+    def _layer(self, key):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        layer = self._render(key)
+        with self.lock:
+            self.cache[key] = layer
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return layer
+
+    def _render(self, key):
+        w, h, lines = key
+        # The same putText calls on black and on white: pixels the text covers
+        # come out the same on both, untouched ones stay black and white
+        black = np.zeros((h, w, 3), dtype=np.uint8)
+        white = np.full((h, w, 3), 255, dtype=np.uint8)
+        self._draw(black, lines)
+        self._draw(white, lines)
+        ys, xs = np.nonzero(np.any(black != 0, axis=2) | np.any(white != 255, axis=2))
+        if len(xs) == 0:
+            return None
+        # Keep only the bounding box of the drawn pixels
+        x0, x1, y0, y1 = xs.min(), xs.max() + 1, ys.min(), ys.max() + 1
+        black = np.ascontiguousarray(black[y0:y1, x0:x1])
+        white = white[y0:y1, x0:x1]
+        covered = np.all(black == white, axis=2)
+        untouched = np.all(black == 0, axis=2) & np.all(white == 255, axis=2)
+        if self.opacity >= 1.0:
+            if not np.all(covered | untouched):
+                # Anti-aliased edges; only putText itself gets them exactly right
+                return 0, 0, None, None, None
+            return x0, y0, black, covered.astype(np.uint8) * 255, None
+        # The black copy is the colour premultiplied by coverage, and
+        # white - black is 255 * (1 - coverage)
+        cover = 255.0 - (white.astype(np.float32) - black)
+        color = (black * self.opacity + 0.5).astype(np.uint8)
+        keep = (255.0 - cover * self.opacity + 0.5).astype(np.uint8)
+        return x0, y0, color, None, keep
+
+
+def static_text(*lines):
+    """TextOverlay for fixed lines that don't depend on the frame size"""
+    lines = list(lines)
+    return TextOverlay(lambda width, height: lines)
@@ -0,0 +1,236 @@
+"""
+Recording - camera frames plus hand landmarks on disk, replayed as a source
+A recording is a directory holding every captured frame (JPEG or lossless
+PNG) with its capture time and, optionally, the hand landmarks found on it at
+full resolution. CAMERA_SOURCE=replay:<dir> feeds it to the shared camera at
+the recorded pace, so the tool1/tool2 streams and the tool3 zoom loop run on
+machines without a webcam. replay-fast:<dir> delivers frames as fast as they
+are read. benchmarks/bench_replay.py uses the stored landmarks as the
+reference for gesture decisions.
+
+Usage:
+    python -m tools.recording record clips/wave.rec --source 0 --seconds 20
+    python -m tools.recording info clips/wave.rec
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+META_FILE = 'meta.json'
+INDEX_FILE = 'frames.jsonl'
+DATA_FILE = 'frames.bin'
+
+
+def hands_to_json(hands):
+    """cvzone hand dicts as plain JSON types"""
+    return [{
+        'lmList': [[int(v) for v in lm] for lm in hand['lmList']],
+        'bbox': [int(v) for v in hand['bbox']],
+        'center': [int(v) for v in hand.get('center', (0, 0))],
+        'type': str(hand.get('type', '')),
+    } for hand in hands]
+
+
+class RecordingWriter:
+    """Appends frames to a new recording directory"""
+
+    def __init__(self, path, image_format='jpg', quality=95):
+        if image_format not in ('jpg', 'png'):
+            raise ValueError("image_format must be 'jpg' or 'png'")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.image_format = image_format
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality] if image_format == 'jpg' else []
+        self.data = open(os.path.join(path, DATA_FILE), 'wb')
+        self.index = open(os.path.join(path, INDEX_FILE), 'w')
+        self.frames = 0
+        self.start = None
+        self.size = None
+        self.has_landmarks = False
+
+    def write(self, img, timestamp, hands=None):
+        """Add one BGR frame captured at monotonic `timestamp`; `hands` may be None"""
+        ret, buffer = cv2.imencode('.' + self.image_format, img, self.params)
+        if not ret:
+            raise RuntimeError("could not encode frame")
+        if self.start is None:
+            self.start = timestamp
+            self.size = (img.shape[1], img.shape[0])
+        data = buffer.tobytes()
+        entry = {'t': round(timestamp - self.start, 6), 'offset': self.data.tell(), 'size': len(data)}
+        if hands is not None:
+            entry['hands'] = hands_to_json(hands)
+            self.has_landmarks = True
+        self.data.write(data)
+        self.index.write(json.dumps(entry) + '\n')
+        self.frames += 1
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+        width, height = self.size or (0, 0)
+        meta = {
+            'frames': self.frames,
+            'width': width,
+            'height': height,
+            'format': self.image_format,
+            'landmarks': self.has_landmarks,
+        }
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+class Recording:
+    """Read access to a recording directory"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+        self.data = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def has_landmarks(self):
+        return self.meta.get('landmarks', False)
+
+    def duration(self):
+        return self.entries[-1]['t'] if self.entries else 0.0
+
+    def timestamp(self, index):
+        """Seconds since the first frame"""
+        return self.entries[index]['t']
+
+    def frame(self, index):
+        """Decoded BGR frame `index`"""
+        if self.data is None:
+            self.data = open(os.path.join(self.path, DATA_FILE), 'rb')
+        entry = self.entries[index]
+        self.data.seek(entry['offset'])
+        buffer = np.frombuffer(self.data.read(entry['size']), dtype=np.uint8)
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    def hands(self, index):
+        """Recorded landmarks for frame `index` (mirrored display coordinates), or None"""
+        return self.entries[index].get('hands')
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+
+class ReplaySource:
+    """Frames from a recording, paced like the original capture and looped by default"""
+
+    # The same frames come round again; the landmark cache matches them on content
+    replay = True
+
+    def __init__(self, path, realtime=True, loop=True):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.recording = None
+        self.index = 0
+        self.started = 0
+
+    def open(self):
+        self.recording = Recording(self.path)
+        self.index = 0
+        self.started = time.monotonic()
+        return len(self.recording) > 0
+
+    def read(self):
+        if self.index >= len(self.recording):
+            if not self.loop:
+                return False, None
+            self.index = 0
+            self.started = time.monotonic()
+        if self.realtime:
+            delay = self.started + self.recording.timestamp(self.index) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        img = self.recording.frame(self.index)
+        self.index += 1
+        return img is not None, img
+
+    def close(self):
+        if self.recording is not None:
+            self.recording.close()
+
+    def __repr__(self):
+        return f"ReplaySource({self.path!r}{'' if self.realtime else ', fast'})"
+
+
+def record(path, source=None, seconds=10.0, landmarks=True, image_format='jpg'):
+    """Record the shared camera for `seconds`, with full-resolution landmarks
+
+    Detection runs on every recorded frame, so with landmarks on the
+    recording keeps only as many frames as the detector can handle.
+    """
+    from tools.camera_service import get_camera
+    from tools.detection_worker import default_detector, detect_hands
+
+    detector = default_detector() if landmarks else None
+    writer = RecordingWriter(path, image_format)
+    camera = get_camera(source).acquire()
+    last_seq = 0
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            packet = camera.wait_for_frame(last_seq)
+            if packet is None:
+                if not camera.running:
+                    # The capture gave up; keep what was recorded so far
+                    print(f"Recording stopped early: capture failed on {camera.source!r}", file=sys.stderr)
+                    break
+                continue
+            last_seq = packet.seq
+            hands = detect_hands(detector, packet.image) if detector is not None else None
+            writer.write(packet.image, packet.timestamp, hands)
+    finally:
+        camera.release()
+        writer.close()
+    return writer.frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    rec = commands.add_parser('record', help="record the camera to a new directory")
+    rec.add_argument('path')
+    rec.add_argument('--source', default=None, help="camera source spec (default: CAMERA_SOURCE or 0)")
+    rec.add_argument('--seconds', type=float, default=10.0)
+    rec.add_argument('--format', choices=['jpg', 'png'], default='jpg', help="png keeps frames lossless")
+    rec.add_argument('--no-landmarks', action='store_true', help="skip hand detection while recording")
+    info = commands.add_parser('info', help="describe a recording")
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        frames = record(args.path, args.source, args.seconds, not args.no_landmarks, args.format)
+        print(f"Recorded {frames} frames to {args.path}", file=sys.stderr)
+    else:
+        recording = Recording(args.path)
+        with_hands = sum(1 for i in range(len(recording)) if recording.hands(i))
+        duration = recording.duration()
+        print(f"{len(recording)} frames, {recording.meta['width']}x{recording.meta['height']} "
+              f"{recording.meta['format']}, {duration:.1f}s "
+              f"({len(recording) / duration if duration else 0:.1f} fps), "
+              f"landmarks: {'yes' if recording.has_landmarks else 'no'}, frames with hands: {with_hands}")
+
+
+if __name__ == '__main__':
+    main()
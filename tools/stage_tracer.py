@@ -0,0 +1,185 @@
+"""
+Stage Tracer - per-stage latency of the vision pipelines
+Each pipeline (tool1, tool2, the detection pool, the camera) records how long
+every stage of a frame took: waiting for the frame, flip, overlay, encode,
+socket write and so on. The last few hundred samples per stage give rolling
+p50/p95/p99 figures for /pipeline_stats, /metrics (Prometheus text format)
+and an optional on-frame HUD.
+
+STAGE_TRACING=0 turns recording off; every call then returns straight away.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from tools.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StageStats:
+    """Rolling window of durations for one stage, plus lifetime sum and count"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {}
+        return {q: samples[min(int(len(samples) * q), len(samples) - 1)] for q in QUANTILES}
+
+
+class Trace:
+    """Timestamps for one frame; mark(stage) records the time since the last mark"""
+
+    __slots__ = ('tracer', 'start', 'last')
+
+    def __init__(self, tracer, start):
+        self.tracer = tracer
+        self.start = self.last = start
+
+    def mark(self, stage):
+        now = time.monotonic()
+        self.tracer.record(stage, now - self.last)
+        self.last = now
+
+    def end(self, stage='total'):
+        """Record the time since begin() under `stage`"""
+        self.tracer.record(stage, time.monotonic() - self.start)
+
+
+class _NullTrace:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+    def end(self, stage='total'):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class StageTracer:
+    """Named stages of one pipeline with rolling latency percentiles
+
+    begin() starts a Trace for a frame. Code further down the same thread
+    (a tool's frame processor, say) adds stages to it with tracer.mark().
+    """
+
+    def __init__(self, name, enabled=True, window=512):
+        self.name = name
+        self.enabled = enabled
+        self.window = window
+        self.stages = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def begin(self, start=None):
+        """Trace for a new frame on this thread; `start` defaults to now"""
+        if not self.enabled:
+            return NULL_TRACE
+        trace = Trace(self, time.monotonic() if start is None else start)
+        self.local.trace = trace
+        return trace
+
+    def mark(self, stage):
+        """Mark `stage` on the current thread's trace, if there is one"""
+        if self.enabled:
+            getattr(self.local, 'trace', NULL_TRACE).mark(stage)
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.window)
+            stats.add(seconds)
+
+    def reset(self):
+        """Forget every stage's samples"""
+        with self.lock:
+            self.stages = {}
+
+    def snapshot(self):
+        """{stage: {'p50', 'p95', 'p99' (ms), 'count', 'sum' (seconds)}}"""
+        with self.lock:
+            stages = {stage: (stats.quantiles(), stats.count, stats.total) for stage, stats in self.stages.items()}
+        return {
+            stage: dict({f"p{int(q * 100)}": round(value * 1000, 2) for q, value in quantiles.items()},
+                        count=count, sum=round(total, 4))
+            for stage, (quantiles, count, total) in stages.items()
+        }
+
+    def draw_hud(self, img, width=220, line_height=18):
+        """Write each stage's p50/p95 in ms into the bottom right of `img`"""
+        lines = [f"{stage}: {stats['p50']:.1f} / {stats['p95']:.1f} ms"
+                 for stage, stats in sorted(self.snapshot().items()) if 'p50' in stats]
+        x = max(img.shape[1] - width, 0)
+        y = img.shape[0] - line_height * len(lines)
+        for text in lines:
+            cv2.putText(img, text, (x, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (0, 0, 0), 3)
+            cv2.putText(img, text, (x, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (0, 255, 255), 1)
+            y += line_height
+        return img
+
+
+_tracers = {}
+_tracers_lock = threading.Lock()
+
+
+def get_tracer(name):
+    """Process-wide tracer for pipeline `name`"""
+    with _tracers_lock:
+        tracer = _tracers.get(name)
+        if tracer is None:
+            tracer = _tracers[name] = StageTracer(name, enabled=os.environ.get('STAGE_TRACING', '1') != '0')
+        return tracer
+
+
+def all_tracers():
+    with _tracers_lock:
+        return dict(_tracers)
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def prometheus_text(gauges=()):
+    """Every tracer as a Prometheus summary, plus `gauges`
+
+    `gauges` is a list of (metric name, help text, [(labels dict, value)]).
+    """
+    lines = [
+        '# HELP vision_stage_seconds Per-stage latency of the vision pipelines',
+        '# TYPE vision_stage_seconds summary',
+    ]
+    for name, tracer in sorted(all_tracers().items()):
+        with tracer.lock:
+            stages = [(stage, stats.quantiles(), stats.count, stats.total) for stage, stats in tracer.stages.items()]
+        for stage, quantiles, count, total in sorted(stages):
+            for q, value in quantiles.items():
+                lines.append(f'vision_stage_seconds{{{_labels(pipeline=name, stage=stage, quantile=q)}}} {value:.6f}')
+            lines.append(f'vision_stage_seconds_sum{{{_labels(pipeline=name, stage=stage)}}} {total:.6f}')
+            lines.append(f'vision_stage_seconds_count{{{_labels(pipeline=name, stage=stage)}}} {count}')
+    for metric, help_text, samples in gauges:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for labels, value in samples:
+            lines.append(f'{metric}{{{_labels(**labels)}}} {value}' if labels else f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
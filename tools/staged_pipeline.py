@@ -0,0 +1,162 @@
+"""
+Staged Pipeline - per-frame work spread over threads with bounded queues
+Each stage has its own worker threads and a short input queue. When a queue
+is full the oldest waiting frame is dropped, so a slow stage sheds load
+instead of adding latency. Stages whose work releases the GIL (OpenCV resize
+and JPEG encoding, MediaPipe inference) then run on several cores at once,
+while the Python-heavy ones (gesture rules, overlays) keep a core busy.
+
+Results reach the sink strictly in submission order: a frame that finishes
+early waits for older frames still being worked on, and frames dropped on the
+way are skipped, so a stream never goes backwards.
+"""
+
+import threading
+from collections import OrderedDict, deque
+
+_PENDING = object()
+_DROPPED = object()
+
+
+class Stage:
+    """One step of a StagedPipeline: `fn(item)` run by `workers` threads
+
+    `fn` returns the item for the next stage, or None to drop the frame.
+    Stages with one worker see frames in order; give stateful steps one worker.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=2):
+        self.name = name
+        self.fn = fn
+        self.workers = max(int(workers), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self.queue = deque()
+        self.ready = threading.Condition()
+        self.busy = 0
+        self.processed = 0
+        self.dropped = 0
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'workers': self.workers,
+            'queued': len(self.queue),
+            'busy': self.busy,
+            'processed': self.processed,
+            'dropped': self.dropped,
+        }
+
+
+class StagedPipeline:
+    """Frames flow through `stages` in turn; `sink(result)` gets them in order
+
+    The sink is called from whichever worker completes the oldest frame, one
+    call at a time. An exception in a stage stops the pipeline and is kept in
+    `error` for the feeding thread to raise.
+    """
+
+    def __init__(self, name, stages, sink):
+        self.name = name
+        self.stages = stages
+        self.sink = sink
+        self.running = False
+        self.error = None
+        self.threads = []
+        self.next_seq = 0
+        self.in_flight = OrderedDict()
+        self.emitted = 0
+        self.order_lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+        for index, stage in enumerate(self.stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,), name=f"{self.name}-{stage.name}-{i}")
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        return self
+
+    def submit(self, item):
+        """Queue `item` for the first stage, dropping the oldest one waiting if full"""
+        with self.order_lock:
+            self.next_seq += 1
+            seq = self.next_seq
+            self.in_flight[seq] = _PENDING
+        self._put(0, seq, item)
+
+    def stop(self, timeout=None):
+        """Stop the workers and wait for them; queued frames are discarded
+
+        With the default `timeout` this returns only once every worker has
+        finished the frame it was on. Returns whether they all have.
+        """
+        self.running = False
+        for stage in self.stages:
+            with stage.ready:
+                stage.ready.notify_all()
+        current = threading.current_thread()
+        for thread in self.threads:
+            if thread is not current:
+                thread.join(timeout)
+        return not any(thread.is_alive() for thread in self.threads if thread is not current)
+
+    def stats(self):
+        return {
+            'stages': [stage.stats() for stage in self.stages],
+            'in_flight': len(self.in_flight),
+            'emitted': self.emitted,
+        }
+
+    def _put(self, index, seq, item):
+        stage = self.stages[index]
+        dropped = None
+        with stage.ready:
+            if len(stage.queue) >= stage.queue_size:
+                dropped, _ = stage.queue.popleft()
+                stage.dropped += 1
+            stage.queue.append((seq, item))
+            stage.ready.notify()
+        if dropped is not None:
+            self._finish(dropped, _DROPPED)
+
+    def _work(self, index):
+        stage = self.stages[index]
+        last = index == len(self.stages) - 1
+        while True:
+            with stage.ready:
+                while not stage.queue and self.running:
+                    stage.ready.wait()
+                if not self.running:
+                    return
+                seq, item = stage.queue.popleft()
+                stage.busy += 1
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                self.error = e
+                self.stop(timeout=0)
+                return
+            finally:
+                with stage.ready:
+                    stage.busy -= 1
+                    stage.processed += 1
+            if result is None:
+                self._finish(seq, _DROPPED)
+            elif last:
+                self._finish(seq, result)
+            else:
+                self._put(index + 1, seq, result)
+
+    def _finish(self, seq, result):
+        # Hand every completed frame at the head of the line to the sink
+        with self.order_lock:
+            self.in_flight[seq] = result
+            while self.in_flight:
+                head_seq, head = next(iter(self.in_flight.items()))
+                if head is _PENDING:
+                    break
+                del self.in_flight[head_seq]
+                if head is not _DROPPED and self.running:
+                    self.sink(head)
+                    self.emitted += 1
@@ -0,0 +1,257 @@
+"""
+State Store - tool status shared by every server worker
+Running flags and live readings live in one SQLite database instead of module
+globals, so `gunicorn -w 4 app:app` gives every worker the same view of which
+tools are running and what the current zoom/volume is. Each write bumps a
+global version number; readers can ask for everything changed since a version,
+block until something changes, or subscribe a callback to a key.
+
+Writes from the same process wake waiters immediately. Writes from other
+workers are picked up by a watcher thread polling SQLite's data_version.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from tools.loop_signal import LoopSignal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Windows API constants for process_alive
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+
+def _windows_process_alive(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Another user's process can exist without us being allowed to open it
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def process_alive(pid):
+    """True if process `pid` still exists"""
+    if pid == os.getpid():
+        return True
+    if sys.platform == "win32":
+        # os.kill() would terminate the process on Windows
+        return _windows_process_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StateStore:
+    """JSON values in SQLite with versioned change notification
+
+    `path=None` keeps the database in memory, shared by the threads of this
+    process only.
+    """
+
+    def __init__(self, path=None, poll_interval=0.05):
+        if path is None:
+            self.path, self.uri = f"file:state-{id(self)}?mode=memory&cache=shared", True
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.path, self.uri = path, False
+        self.poll_interval = poll_interval
+        self.local = threading.local()
+        self.generation = 0
+        self.changed = threading.Condition()
+        self.local_write = threading.Event()
+        self.signal = LoopSignal()
+        self.subscribers = {}
+        self.watcher = None
+        self.lock = threading.Lock()
+        # Holds an in-memory database open for the lifetime of the store
+        self.keeper = self._connect()
+        self.keeper.execute("CREATE TABLE IF NOT EXISTS state"
+                            " (key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL)")
+        self.keeper.execute("CREATE INDEX IF NOT EXISTS state_version ON state (version)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, uri=self.uri, timeout=5.0, isolation_level=None)
+        if not self.uri:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # One connection per thread; reconnect in a child forked after import
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = self.local.conn = self._connect()
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def version(self):
+        return self._conn().execute("SELECT COALESCE(MAX(version), 0) FROM state").fetchone()[0]
+
+    def set(self, key, value):
+        """Store `value` under `key`; returns the new version"""
+        return self.update(key, lambda current: value)[1]
+
+    def update(self, key, fn, default=None):
+        """Atomically replace the value of `key` with fn(current value)
+
+        `default` stands in for a missing key. Nothing is written when fn
+        returns a value equal to the current one. Returns (value, version),
+        with version None when nothing changed.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+            current = default if row is None else json.loads(row[0])
+            value = fn(current)
+            if row is not None and value == current:
+                conn.execute("COMMIT")
+                return current, None
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM state").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO state (key, value, version) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), version))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify()
+        self.local_write.set()
+        return value, version
+
+    def compare_and_set(self, key, expected, value):
+        """Set `key` to `value` only if it currently equals `expected` (missing counts as None)"""
+        swapped = []
+
+        def swap(current):
+            if current != expected:
+                return current
+            swapped.append(True)
+            return value
+
+        self.update(key, swap)
+        return bool(swapped)
+
+    def changes(self, since_version, keys=None):
+        """(version, {key: value}) for every key in `keys` written after `since_version`"""
+        conn = self._conn()
+        rows = conn.execute("SELECT key, value, version FROM state WHERE version > ?", (since_version,)).fetchall()
+        version = max([row[2] for row in rows], default=since_version)
+        return version, {key: json.loads(value) for key, value, _ in rows if keys is None or key in keys}
+
+    def wait(self, since_version, keys=None, timeout=15.0):
+        """Block until a key in `keys` changes after `since_version`
+
+        Returns (version, {key: value}); the dict is empty on timeout.
+        """
+        self._start_watcher()
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self.generation
+            version, changed = self.changes(since_version, keys)
+            if changed:
+                return version, changed
+            since_version = version
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return since_version, {}
+            with self.changed:
+                if generation == self.generation:
+                    self.changed.wait(remaining)
+
+    async def wait_async(self, since_version, keys=None, timeout=15.0):
+        """wait() for coroutines: suspends instead of blocking the thread"""
+        self._start_watcher()
+        deadline = time.monotonic() + timeout
+        while True:
+            future = self.signal.future()
+            version, changed = self.changes(since_version, keys)
+            if changed:
+                return version, changed
+            since_version = version
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return since_version, {}
+            await self.signal.wait(future, remaining)
+
+    def subscribe(self, key, callback):
+        """Call callback(value) on the watcher thread whenever `key` changes"""
+        with self.lock:
+            self.subscribers.setdefault(key, []).append(callback)
+        self._start_watcher()
+
+    def _notify(self):
+        with self.changed:
+            self.generation += 1
+            self.changed.notify_all()
+        self.signal.notify()
+
+    def _start_watcher(self):
+        with self.lock:
+            if self.watcher is None or not self.watcher.is_alive():
+                self.watcher = threading.Thread(target=self._watch, name="state-store-watcher")
+                self.watcher.daemon = True
+                self.watcher.start()
+
+    def _watch(self):
+        conn = self._conn()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        version = self.version()
+        while True:
+            local = self.local_write.wait(self.poll_interval)
+            self.local_write.clear()
+            # data_version moves whenever another connection commits
+            current = conn.execute("PRAGMA data_version").fetchone()[0]
+            if current == data_version and not local:
+                continue
+            data_version = current
+            self._notify()
+            with self.lock:
+                subscribers = {key: list(callbacks) for key, callbacks in self.subscribers.items()}
+            if not subscribers:
+                version = self.version()
+                continue
+            version, changed = self.changes(version, subscribers)
+            for key, value in changed.items():
+                for callback in subscribers[key]:
+                    try:
+                        callback(value)
+                    except Exception as e:
+                        print(f"State subscriber for {key} failed: {e}", file=sys.stderr)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """Process-wide store; STATE_DB overrides the default instance/state.sqlite3"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StateStore(os.environ.get('STATE_DB', os.path.join(ROOT, 'instance', 'state.sqlite3')))
+        return _store
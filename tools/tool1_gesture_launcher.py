@@ -1,10 +1,17 @@
 # tools/tool1_gesture_launcher.py
+# Run from the repository root with: python -m tools.tool1_gesture_launcher
 import os
 import cv2
+import numpy as np
 import time
 from cvzone.HandTrackingModule import HandDetector
 import sys
 import signal
+import threading
+
+from tools.camera_service import CameraService, ReconnectPolicy
+from tools.gesture_engine import GestureEngine
+from tools.gesture_registry import GestureRegistry
 
 cap = None
 
@@ -28,67 +35,50 @@ signal.signal(signal.SIGINT, cleanup)
 def start_gesture_detection():
     global cap
     print("=== Gesture detection script started ===", file=sys.stderr)
-    import time
-    max_retries = 5
-    retry_delay = 1  # seconds
-
-    cap = None
-    for attempt in range(max_retries):
-        cap = cv2.VideoCapture(0)
-        if cap.isOpened():
-            break
-        print(f"Camera not available (attempt {attempt+1}/{max_retries}), retrying...", file=sys.stderr)
-        time.sleep(retry_delay)
-    else:
-        print("Error: Could not open video stream after several attempts. Camera may be in use by another process.", file=sys.stderr)
-        return
+    # Frames come from CAMERA_SOURCE (e.g. shm:<name> to share a camera
+    # another process captures); give up after 5 attempts to open it
+    cap = CameraService(policy=ReconnectPolicy(base_delay=1.0, max_retries=5)).acquire()
 
     detector = HandDetector(detectionCon=0.8, maxHands=1)
+    registry = GestureRegistry()
+    # Same debouncing as the web app: a pattern fires once it is stable
+    engine = GestureEngine.from_env()
+    # Set by the dispatcher once the launched action has finished
+    launched = threading.Event()
+
+    def finished(future):
+        if future.exception() is not None or future.result() is False:
+            print("ACTION: launch failed.", file=sys.stderr)
+        launched.set()
+
     print("Gesture detection loop started.", file=sys.stderr)
 
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Failed to read from camera. Breaking loop.", file=sys.stderr)
+        for packet in cap.frames():
+            if launched.is_set():
                 break
+            # Camera frames are shared and read-only; findHands draws on its input
+            frame = packet.image.copy()
 
-            img, hands = detector.findHands(frame, draw=True)
+            hands, img = detector.findHands(frame, draw=True)
 
-            if isinstance(hands, list) and len(hands) > 0:
-                hand = hands[0]
-                if isinstance(hand, dict) and 'lmList' in hand:
-                    fingers = detector.fingersUp(hand)
-                    print(f"DEBUG: Detected fingers pattern: {fingers}", file=sys.stderr)
+            hand = hands[0] if isinstance(hands, list) and hands else None
+            if not (isinstance(hand, dict) and 'lmList' in hand):
+                hand = None
+            fingers = engine.update(hand, packet.timestamp)
 
-                    # 1 Finger (Index Finger Up)
-                    if fingers == [0,1,0,0,0]:
-                        print("ACTION: Single finger detected - Opening Google.", file=sys.stderr)
-                        open_browser("https://www.google.com")
-                        break
-                    # 2 Fingers (Index and Middle Finger Up)
-                    elif fingers == [0,1,1,0,0]:
-                        print("ACTION: Two fingers detected - Opening YouTube.", file=sys.stderr)
-                        open_browser("https://www.youtube.com")
-                        break
-                    # 3 Fingers (Index, Middle, Ring Finger Up)
-                    elif fingers == [0,1,1,1,0]:
-                        print("ACTION: Three fingers detected - Opening Amazon.", file=sys.stderr)
-                        open_browser("https://www.amazon.com")
-                        break
-                    # 5 Fingers (All Fingers Up - Open Palm)
-                    elif fingers == [1,1,1,1,1]:
-                        print("ACTION: All five fingers detected - Opening WhatsApp Web.", file=sys.stderr)
-                        os.system("start chrome https://web.whatsapp.com")
-                        break
-                    # MyGyanVihar (Currently assigned to [0,1,1,1,1])
-                    elif fingers == [0,1,1,1,1]:
-                        print("ACTION: Four fingers (thumb down) detected - Opening MyGyanVihar.", file=sys.stderr)
-                        open_browser("https://mygyanvihar.com")
-                        break
+            if fingers is not None:
+                # Same gesture table as the web app (gestures.json)
+                gesture, action = registry.trigger(fingers)
+                if gesture is not None and action is None:
+                    # The dispatcher rejected it: still opening, too soon after the last one, or queue full
+                    print(f"ACTION: {gesture.label} detected - {gesture.name} not launched (busy).", file=sys.stderr)
+                elif gesture is not None:
+                    # The launch runs on the dispatcher; the loop ends when it finishes
+                    print(f"ACTION: {gesture.label} detected - Opening {gesture.name}.", file=sys.stderr)
+                    action.add_done_callback(finished)
 
             # Ensure img is a numpy array before showing
-            import numpy as np
             if not isinstance(img, np.ndarray):
                 img = frame
 
@@ -109,14 +99,5 @@ def start_gesture_detection():
         cv2.destroyAllWindows()
         print("Camera released and windows destroyed.", file=sys.stderr)
 
-# Helper function for cross-platform browser opening (unchanged)
-def open_browser(url):
-    if sys.platform == "win32":
-        os.system(f"start chrome {url}")
-    elif sys.platform == "darwin":  # macOS
-        os.system(f"open -a 'Google Chrome' {url}")
-    else:  # Linux and other Unix-like
-        os.system(f"xdg-open {url}")
-
 if __name__ == '__main__':
     start_gesture_detection()
\ No newline at end of file
@@ -1,16 +1,39 @@
+# Standalone gun gesture window; run from the repository root with:
+#     python -m tools.tool2_gun_detector
+import os
+import sys
+
 import cv2
 from cvzone.HandTrackingModule import HandDetector
-from playsound import playsound
-import threading
+
+from tools.action_dispatcher import get_action_dispatcher
+from tools.audio_mixer import get_audio_mixer
+from tools.camera_service import CameraService
+
+FIRE_SOUND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'sound.mp3')
+
+# Same as the web app: the shot is mixed in-process when the sound could be
+# decoded, otherwise played through the dispatcher one at a time
+mixer = get_audio_mixer()
+try:
+    mixer.load('fire', FIRE_SOUND)
+    mixer_loaded = True
+except Exception as e:
+    print(f"Fire sound not preloaded ({e}); using playsound", file=sys.stderr)
+    mixer_loaded = False
 
 # Function to play sound
 def play_fire_sound():
-    threading.Thread(target=playsound, args=("Sound.mp3",), daemon=True).start()
+    if mixer_loaded:
+        mixer.play('fire', min_interval=0.3)
+    else:
+        from playsound import playsound
+        # A held pose re-fires only after the last shot has finished
+        get_action_dispatcher().submit('fire_sound', playsound, FIRE_SOUND, min_interval=0.3)
 
-# Video capture setup
-cap = cv2.VideoCapture(0)
-cap.set(3, 1280)  # Width
-cap.set(4, 720)   # Height
+# Video capture setup (1280x720) from CAMERA_SOURCE; shm:<name> reads a
+# camera another process captures instead of opening the device again
+camera = CameraService().acquire()
 
 # Hand Detector
 detector = HandDetector(detectionCon=0.8, maxHands=1)
@@ -19,9 +42,8 @@ detector = HandDetector(detectionCon=0.8, maxHands=1)
 fire_effect = False
 fire_counter = 0
 
-while True:
-    success, img = cap.read()
-    img = cv2.flip(img, 1)  # Mirror the image
+for packet in camera.frames():
+    img = cv2.flip(packet.image, 1)  # Mirror the image
 
     # Detect hands
     hands, img = detector.findHands(img)
@@ -58,5 +80,6 @@ while True:
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
-cap.release()
+camera.release()
+mixer.close()
 cv2.destroyAllWindows()
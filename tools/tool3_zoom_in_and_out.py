@@ -1,21 +1,25 @@
 # Use the /tool3 page in your web app and click "Finger Zoom" to control zoom with your hand.
+# Standalone, from the repository root: python -m tools.tool3_zoom_in_and_out photo.jpg
 
 import cv2
 from cvzone.HandTrackingModule import HandDetector
 import numpy as np
+import glob
 import sys
 import os
 
+from tools.camera_service import CameraService, ReconnectPolicy
+from tools.image_pyramid import ImagePyramid
+
 # Get image path from command-line argument or use default
 if len(sys.argv) > 1:
     image_path = sys.argv[1]
 else:
     image_path = "photo@.jpg"  # Default fallback
 
-# Video capture setup
-cap = cv2.VideoCapture(0)
-cap.set(3, 1280)  # Width
-cap.set(4, 720)   # Height
+# Video capture setup (1280x720); failed reads back off and reconnect
+# instead of spinning, giving up after 5 attempts to reopen the camera
+camera = CameraService(policy=ReconnectPolicy(base_delay=1.0, max_retries=5)).acquire()
 
 # Hand Detector
 detector = HandDetector(detectionCon=0.8, maxHands=1)
@@ -24,14 +28,30 @@ detector = HandDetector(detectionCon=0.8, maxHands=1)
 image = cv2.imread(image_path)
 if image is None:
     raise FileNotFoundError(f"The image file '{image_path}' was not found. Check the path.")
+# Reuse the newest pyramid written at upload time (<image>.<ms>.pyramid), or
+# build one in memory
+saved = sorted((d for d in glob.glob(glob.escape(image_path) + '.*.pyramid') if ImagePyramid.saved(d)),
+               key=os.path.getmtime)
+if saved:
+    pyramid = ImagePyramid.load(saved[-1])
+else:
+    pyramid = ImagePyramid.build(image)
 scale = 1.0  # Initial scale factor
 center_x, center_y = image.shape[1] // 2, image.shape[0] // 2
 
+last_seq = 0
 while True:
-    success, frame = cap.read()
-    if not success:
+    packet = camera.wait_for_frame(last_seq, timeout=0.5)
+    if packet is None:
+        if not camera.running:
+            print("Error: Could not read from the camera. Camera may be in use by another process.", file=sys.stderr)
+            break
+        # Keep the window responsive while the camera recovers
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
         continue
-    frame = cv2.flip(frame, 1)  # Mirror the webcam frame
+    last_seq = packet.seq
+    frame = cv2.flip(packet.image, 1)  # Mirror the webcam frame
 
     # Detect hands
     hands, _ = detector.findHands(frame)
@@ -49,30 +69,9 @@ while True:
         # Map the distance to scale (adjust values as needed)
         scale = float(np.clip(np.interp(length, [50, 300], [0.5, 3.0]), 0.2, 5.0))
 
-    # Resize the image based on scale
-    resized_img = cv2.resize(image, None, fx=scale, fy=scale)
-
-    # Center crop or pad the resized image to 1280x720
-    target_w, target_h = 1280, 720
-    h, w, _ = resized_img.shape
-    if w > target_w:
-        x_start = (w - target_w) // 2
-        x_end = x_start + target_w
-        cropped_img = resized_img[:, x_start:x_end]
-    else:
-        # Pad left/right
-        pad_left = (target_w - w) // 2
-        pad_right = target_w - w - pad_left
-        cropped_img = cv2.copyMakeBorder(resized_img, 0, 0, pad_left, pad_right, cv2.BORDER_CONSTANT, value=[0,0,0])
-    if h > target_h:
-        y_start = (h - target_h) // 2
-        y_end = y_start + target_h
-        cropped_img = cropped_img[y_start:y_end, :]
-    else:
-        # Pad top/bottom
-        pad_top = (target_h - h) // 2
-        pad_bottom = target_h - h - pad_top
-        cropped_img = cv2.copyMakeBorder(cropped_img, pad_top, pad_bottom, 0, 0, cv2.BORDER_CONSTANT, value=[0,0,0])
+    # Render just the 1280x720 viewport from the nearest pyramid level, so
+    # the cost stays the same at any zoom scale
+    cropped_img = pyramid.render(scale, (1280, 720))
 
     # Show only the zoomed image (not overlayed on webcam)
     cv2.imshow("Zoom In/Out", cropped_img)
@@ -81,5 +80,5 @@ while True:
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
-cap.release()
+camera.release()
 cv2.destroyAllWindows()
\ No newline at end of file
@@ -1,6 +1,7 @@
 """
 AI Voice Assistant - Tool 6
 A comprehensive voice assistant that can perform various tasks without external APIs
+Run standalone with: python -m tools.tool6_voice_assistance
 """
 
 import speech_recognition as sr
@@ -15,10 +16,27 @@ import subprocess
 import threading
 import time
 import math
+from concurrent.futures import TimeoutError as FutureTimeout
 import cv2
 import numpy as np
 from playsound import playsound
 
+from tools.action_dispatcher import get_action_dispatcher
+
+# How long a reply waits for its launch, so a missing program can still be reported
+LAUNCH_WAIT = 2.0
+
+def launch_error(future, timeout=LAUNCH_WAIT):
+    """Why a queued launch failed, or None if it worked or is still starting"""
+    try:
+        result = future.result(timeout)
+    except FutureTimeout:
+        return None
+    except Exception as e:
+        return str(e)
+    # webbrowser.open reports a missing browser by returning False
+    return "no program could open it" if result is False else None
+
 class VoiceAssistant:
     def __init__(self):
         # Initialize speech recognition
@@ -152,42 +170,40 @@ class VoiceAssistant:
     
     def open_application(self, app_name):
         """Open various applications"""
-        try:
-            if app_name in ['browser', 'internet']:
-                webbrowser.open('https://www.google.com')
-                return "Opening web browser"
-            
-            elif app_name == 'youtube':
-                webbrowser.open('https://www.youtube.com')
-                return "Opening YouTube"
-            
-            elif app_name == 'google':
-                webbrowser.open('https://www.google.com')
-                return "Opening Google"
-            
-            elif app_name in ['calculator', 'calc']:
-                if sys.platform == "win32":
-                    subprocess.Popen(['calc.exe'])
-                elif sys.platform == "darwin":
-                    subprocess.Popen(['open', '-a', 'Calculator'])
-                else:
-                    subprocess.Popen(['gnome-calculator'])
-                return "Opening calculator"
-            
-            elif app_name in ['notepad', 'text editor']:
-                if sys.platform == "win32":
-                    subprocess.Popen(['notepad.exe'])
-                elif sys.platform == "darwin":
-                    subprocess.Popen(['open', '-a', 'TextEdit'])
-                else:
-                    subprocess.Popen(['gedit'])
-                return "Opening text editor"
-            
+        if app_name in ['browser', 'internet']:
+            command, reply = 'https://www.google.com', "Opening web browser"
+        elif app_name == 'youtube':
+            command, reply = 'https://www.youtube.com', "Opening YouTube"
+        elif app_name == 'google':
+            command, reply = 'https://www.google.com', "Opening Google"
+        elif app_name in ['calculator', 'calc']:
+            if sys.platform == "win32":
+                command = ['calc.exe']
+            elif sys.platform == "darwin":
+                command = ['open', '-a', 'Calculator']
             else:
-                return f"Sorry, I don't know how to open {app_name}"
-                
-        except Exception as e:
-            return f"Error opening {app_name}: {str(e)}"
+                command = ['gnome-calculator']
+            reply = "Opening calculator"
+        elif app_name in ['notepad', 'text editor']:
+            if sys.platform == "win32":
+                command = ['notepad.exe']
+            elif sys.platform == "darwin":
+                command = ['open', '-a', 'TextEdit']
+            else:
+                command = ['gedit']
+            reply = "Opening text editor"
+        else:
+            return f"Sorry, I don't know how to open {app_name}"
+
+        # Launch on the action queue; repeats within 2 seconds are ignored
+        launch = webbrowser.open if isinstance(command, str) else subprocess.Popen
+        future = get_action_dispatcher().submit(f"open:{app_name}", launch, command, min_interval=2.0)
+        if future is None:
+            return f"Already opening {app_name}"
+        error = launch_error(future)
+        if error is not None:
+            return f"Error opening {app_name}: {error}"
+        return reply
     
     def control_volume(self, action):
         """Control system volume"""
@@ -259,12 +275,14 @@ class VoiceAssistant:
     
     def web_search(self, query):
         """Perform web search"""
-        try:
-            search_url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
-            webbrowser.open(search_url)
-            return f"Searching for {query} on Google"
-        except Exception as e:
-            return f"Search error: {str(e)}"
+        search_url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
+        future = get_action_dispatcher().submit(f"search:{query}", webbrowser.open, search_url)
+        if future is None:
+            return f"Already searching for {query}"
+        error = launch_error(future)
+        if error is not None:
+            return f"Search error: {error}"
+        return f"Searching for {query} on Google"
     
     def get_help(self):
         """Get list of available commands"""
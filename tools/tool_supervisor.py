@@ -0,0 +1,298 @@
+"""
+Tool Supervisor - warm worker processes for the desktop tool scripts
+Each registered tool keeps one idle worker process (tools/tool_worker.py) with
+OpenCV and cvzone already imported. Starting a tool hands the script's module
+name (e.g. tools.tool4_facedetection) to that worker over its stdin pipe, so the start costs milliseconds instead of a fresh
+interpreter and model imports. When a job ends or crashes, a new warm worker
+is spawned in the background. Every tool gets the same start/stop/status.
+
+Given the app's state store, running tools are recorded there with the pid
+of their process and of the server process that started them, so any
+gunicorn worker can report or stop a tool another one started, and only one
+server process keeps warm workers.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from tools.state_store import process_alive
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Worker states reported by status()
+WARMING = 'warming'
+READY = 'ready'
+RUNNING = 'running'
+STOPPED = 'stopped'
+
+
+class ToolWorker:
+    """One tool script plus the warm process that will run it next
+
+    `module` is the script's module name, run as `python -m <module>` would.
+    """
+
+    def __init__(self, name, module, preload=(), warm=True, restart_delay=1.0, ready_timeout=60.0):
+        self.name = name
+        self.module = module
+        self.preload = list(preload)
+        self.restart_delay = restart_delay
+        self.ready_timeout = ready_timeout
+        self.process = None
+        self.state = STOPPED
+        self.closed = False
+        self.stopping = False
+        self.ready = threading.Event()
+        self.started_at = None
+        self.start_ms = None
+        self.warmup_ms = None
+        self.last_exit = None
+        self.crashes = 0
+        self.lock = threading.Lock()
+        if warm:
+            self.warm_up()
+
+    def _spawn(self):
+        self.ready.clear()
+        self.state = WARMING
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'tools.tool_worker'] + self.preload,
+            cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+            # Ctrl+C in the server's terminal should not reach idle workers
+            **({'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP} if sys.platform == "win32"
+               else {'start_new_session': True}),
+        )
+        reader = threading.Thread(target=self._read, args=(self.process,), name=f"{self.name}-worker-reader")
+        reader.daemon = True
+        reader.start()
+
+    def _read(self, process):
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            with self.lock:
+                if process is not self.process:
+                    break
+                if message['event'] == 'ready':
+                    self.warmup_ms = message.get('warmup_ms')
+                    self.state = READY
+                    self.ready.set()
+                elif message['event'] == 'started':
+                    self.start_ms = round((time.monotonic() - self.started_at) * 1000, 1)
+                elif message['event'] == 'finished':
+                    self.last_exit = message.get('code')
+        code = process.wait()
+        with self.lock:
+            if process is not self.process:
+                return
+            crashed = self.state in (WARMING, RUNNING) and not self.stopping and self.last_exit is None
+            if crashed:
+                self.crashes += 1
+                self.last_exit = code
+                print(f"{self.name} worker exited unexpectedly with code {code}", file=sys.stderr)
+            self.process = None
+            self.stopping = False
+            self.state = STOPPED
+            self.ready.clear()
+            if self.closed:
+                return
+        # Keep a warm worker for the next start; back off after a crash
+        if crashed:
+            time.sleep(self.restart_delay)
+        with self.lock:
+            if self.process is None and not self.closed:
+                self._spawn()
+
+    def warm_up(self):
+        with self.lock:
+            if self.process is None and not self.closed:
+                self._spawn()
+
+    def start(self, argv=()):
+        """Run the script in the warm worker; False if it is already running"""
+        with self.lock:
+            if self.state == RUNNING:
+                return False
+            if self.process is None:
+                self._spawn()
+        if not self.ready.wait(self.ready_timeout):
+            raise RuntimeError(f"{self.name} worker did not become ready")
+        with self.lock:
+            if self.state != READY:
+                return False
+            self.started_at = time.monotonic()
+            self.last_exit = None
+            self.state = RUNNING
+            self.process.stdin.write(json.dumps({'module': self.module, 'argv': list(argv)}) + '\n')
+            self.process.stdin.flush()
+        return True
+
+    def stop(self, timeout=5.0):
+        """Interrupt the running script; False if it was not running"""
+        with self.lock:
+            if self.state != RUNNING or self.process is None:
+                return False
+            self.stopping = True
+            process = self.process
+        try:
+            # The scripts clean up their camera and windows on SIGINT
+            if sys.platform == "win32":
+                process.terminate()
+            else:
+                process.send_signal(signal.SIGINT)
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        return True
+
+    def close(self):
+        """Stop the tool and do not spawn another worker"""
+        with self.lock:
+            self.closed = True
+            process = self.process
+        if process is not None and process.poll() is None:
+            self.stop(timeout=2.0)
+            if process.poll() is None:
+                process.kill()
+
+    def is_running(self):
+        return self.state == RUNNING
+
+    def status(self):
+        with self.lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'pid': self.process.pid if self.process else None,
+                'warmup_ms': self.warmup_ms,
+                'start_ms': self.start_ms,
+                'last_exit': self.last_exit,
+                'crashes': self.crashes,
+            }
+
+
+class ToolSupervisor:
+    """Registry of ToolWorkers keyed by tool name"""
+
+    def __init__(self, warm=None, state_store=None):
+        self.warm = os.environ.get('TOOL_WORKERS_WARM', '1') != '0' if warm is None else warm
+        self.state_store = state_store
+        self.workers = {}
+
+    def register(self, name, module, preload=()):
+        worker = ToolWorker(name, module, preload, warm=self.warm)
+        self.workers[name] = worker
+        return worker
+
+    def warm_up(self):
+        """Spawn a warm worker for every tool that has none (TOOL_WORKERS_WARM=0 skips this)
+
+        With a state store only the first server process to get here keeps
+        warm workers; the others spawn one when a tool is started.
+        """
+        if os.environ.get('TOOL_WORKERS_WARM', '1') == '0':
+            return
+        if self.state_store is not None:
+            pid = os.getpid()
+            owner, _ = self.state_store.update(
+                'tools.warm_owner', lambda current: current if _alive(current) else pid)
+            if owner != pid:
+                return
+        for worker in self.workers.values():
+            worker.warm_up()
+
+    def owner(self, name):
+        """{'pid', 'server'} of the running tool `name`, from any server process, or None"""
+        if self.state_store is None:
+            return None
+        entry = self.state_store.get(f'tools.{name}')
+        return entry if _running(entry) else None
+
+    def start(self, name, argv=()):
+        worker = self.workers[name]
+        if self.state_store is None:
+            return worker.start(argv)
+        key = f'tools.{name}'
+        # Claimed before the (possibly slow) start, so two servers can't both start it
+        claim = {'pid': None, 'server': os.getpid()}
+        owner, _ = self.state_store.update(key, lambda current: current if _running(current) else claim)
+        if owner != claim:
+            return False
+        started = False
+        try:
+            started = worker.start(argv)
+        finally:
+            if started:
+                self.state_store.compare_and_set(key, claim, dict(claim, pid=worker.status()['pid']))
+            else:
+                self.state_store.compare_and_set(key, claim, None)
+        return started
+
+    def stop(self, name, timeout=5.0):
+        worker = self.workers[name]
+        if self.state_store is None:
+            return worker.stop(timeout)
+        key = f'tools.{name}'
+        entry = self.state_store.get(key)
+        if worker.is_running():
+            stopped = worker.stop(timeout)
+        elif _running(entry) and entry['pid'] is not None:
+            # Started by another server process; signal its worker directly
+            stopped = _interrupt(entry['pid'], timeout)
+        else:
+            stopped = False
+        self.state_store.compare_and_set(key, entry, None)
+        return stopped
+
+    def is_running(self, name):
+        return self.workers[name].is_running() or self.owner(name) is not None
+
+    def status(self, name=None):
+        if name is None:
+            return {name: self.status(name) for name in self.workers}
+        status = self.workers[name].status()
+        owner = self.owner(name)
+        if owner is not None and owner['server'] != os.getpid():
+            status.update(state=RUNNING, pid=owner['pid'], server=owner['server'])
+        return status
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.close()
+        if self.state_store is not None:
+            self.state_store.compare_and_set('tools.warm_owner', os.getpid(), None)
+
+
+def _alive(pid):
+    return type(pid) is int and process_alive(pid)
+
+
+def _running(entry):
+    # A claimed tool counts as running while its server is still starting it
+    if not isinstance(entry, dict):
+        return False
+    return _alive(entry['pid']) if entry['pid'] is not None else _alive(entry['server'])
+
+
+def _interrupt(pid, timeout):
+    """SIGINT `pid` like ToolWorker.stop(), killing it after `timeout` seconds"""
+    try:
+        os.kill(pid, signal.SIGTERM if sys.platform == "win32" else signal.SIGINT)
+    except OSError:
+        return False
+    deadline = time.monotonic() + timeout
+    while process_alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if process_alive(pid) and sys.platform != "win32":
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    return True
@@ -0,0 +1,59 @@
+"""
+Tool Worker - warm Python process that runs one tool script on request
+Started by the tool supervisor with the heavy imports (OpenCV, cvzone) done
+up front, then waits on stdin for a JSON job naming the script's module, which
+it runs like `python -m <module>`. Status
+messages go back as JSON lines on the original stdout; anything the script
+prints lands on stderr.
+
+Usage (normally only by tools/tool_supervisor.py):
+    python -m tools.tool_worker cv2 cvzone.HandTrackingModule
+"""
+
+import importlib
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+
+
+def main():
+    # Keep the real stdout for protocol messages and point fd 1 at stderr
+    protocol = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+
+    def send(**message):
+        protocol.write(json.dumps(message) + '\n')
+
+    start = time.monotonic()
+    for module in sys.argv[1:]:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Tool worker could not preload {module}: {e}", file=sys.stderr)
+    send(event='ready', pid=os.getpid(), warmup_ms=round((time.monotonic() - start) * 1000, 1))
+
+    line = sys.stdin.readline()
+    if not line:
+        return
+    job = json.loads(line)
+    sys.argv = [job['module']] + job.get('argv', [])
+    send(event='started')
+    code = 0
+    try:
+        runpy.run_module(job['module'], run_name='__main__', alter_sys=True)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except KeyboardInterrupt:
+        # The supervisor stops a tool with SIGINT
+        code = 130
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    send(event='finished', code=code)
+
+
+if __name__ == '__main__':
+    main()